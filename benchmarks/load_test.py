@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+HTTP load benchmark with per-endpoint latency percentiles.
+
+Drives the API with concurrent async clients, either in-process through the
+ASGI app (default, no server needed) or against a running server (--base-url).
+Each virtual user loops over weighted scenarios: login, tenant switch, project
+list, task board and task update. Results can be saved as a baseline JSON file
+and later runs compared against it to catch regressions between commits.
+
+Requires httpx (pip install httpx) and a seeded database
+(python -m src.unified_seed_data or python -m src.generate_synthetic_data).
+Per-tenant rate limits would throttle the virtual users; run with
+RATE_LIMIT_ENABLED=false unless the limits themselves are being measured.
+
+Usage:
+    python -m benchmarks.load_test --concurrency 20 --duration 30 --save-baseline benchmarks/baseline.json
+    python -m benchmarks.load_test --baseline benchmarks/baseline.json --max-regression 0.2
+    python -m benchmarks.load_test --pool-size 20 --concurrency 50
+    python -m benchmarks.load_test --base-url http://localhost:8000
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import httpx
+except ImportError:
+    print("❌ httpx is required for the load benchmark: pip install httpx")
+    sys.exit(1)
+
+SCENARIO_WEIGHTS = [
+    ("login", 1),
+    ("tenant_switch", 2),
+    ("project_list", 4),
+    ("task_board", 4),
+    ("task_update", 2),
+]
+
+class Recorder:
+    """Collects latencies (ms) and error counts per endpoint label"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, label: str, elapsed_ms: float, ok: bool):
+        self.latencies.setdefault(label, []).append(elapsed_ms)
+        if not ok:
+            self.errors[label] = self.errors.get(label, 0) + 1
+
+    async def request(self, client, label: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            response, ok = None, False
+        self.record(label, (time.perf_counter() - started) * 1000, ok)
+        return response
+
+def percentile(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def summarize(recorder: Recorder, elapsed: float) -> dict:
+    endpoints = {}
+    total = 0
+    for label, values in sorted(recorder.latencies.items()):
+        values = sorted(values)
+        total += len(values)
+        endpoints[label] = {
+            "count": len(values),
+            "errors": recorder.errors.get(label, 0),
+            "throughput": round(len(values) / elapsed, 2),
+            "mean_ms": round(sum(values) / len(values), 2),
+            "p50_ms": round(percentile(values, 0.50), 2),
+            "p95_ms": round(percentile(values, 0.95), 2),
+            "p99_ms": round(percentile(values, 0.99), 2),
+        }
+    return {
+        "total_requests": total,
+        "duration_s": round(elapsed, 2),
+        "throughput": round(total / elapsed, 2) if elapsed else 0.0,
+        "endpoints": endpoints,
+    }
+
+class VirtualUser:
+    def __init__(self, client, recorder: Recorder, args, rng: random.Random):
+        self.client = client
+        self.recorder = recorder
+        self.args = args
+        self.rng = rng
+        self.headers = {}
+        self.tenant_ids = []
+        self.project_ids = []
+        self.task_ids = []
+
+    async def setup(self):
+        await self.login()
+        response = await self.client.get("/tenants/my-tenants", headers=self.headers)
+        response.raise_for_status()
+        self.tenant_ids = [tenant["id"] for tenant in response.json()["tenants"]]
+        if self.args.tenant_id:
+            self.tenant_ids = [self.args.tenant_id]
+        if not self.tenant_ids:
+            raise RuntimeError(f"{self.args.email} is not a member of any tenant")
+        self.headers["X-Tenant-ID"] = self.tenant_ids[0]
+
+        response = await self.client.get("/projects", params={"limit": 100}, headers=self.headers)
+        response.raise_for_status()
+        self.project_ids = [project["id"] for project in response.json()["projects"]]
+        response = await self.client.get("/tasks", params={"limit": 100}, headers=self.headers)
+        response.raise_for_status()
+        self.task_ids = [task["id"] for task in response.json()["tasks"]]
+
+    async def login(self):
+        response = await self.recorder.request(
+            self.client, "POST /auth/login", "POST", "/auth/login",
+            json={"email": self.args.email, "password": self.args.password}
+        )
+        if response is not None and response.status_code == 200:
+            self.headers["Authorization"] = f"Bearer {response.json()['token']}"
+
+    async def tenant_switch(self):
+        await self.recorder.request(self.client, "GET /tenants/my-tenants", "GET", "/tenants/my-tenants",
+                                    headers=self.headers)
+        tenant_id = self.rng.choice(self.tenant_ids)
+        await self.recorder.request(self.client, "GET /tenants/{tenant_id}", "GET", f"/tenants/{tenant_id}",
+                                    headers=self.headers)
+
+    async def project_list(self):
+        await self.recorder.request(self.client, "GET /projects", "GET", "/projects",
+                                    params={"page": 1, "limit": 20}, headers=self.headers)
+
+    async def task_board(self):
+        if not self.project_ids:
+            return
+        await self.recorder.request(self.client, "GET /tasks?project", "GET", "/tasks",
+                                    params={"project": self.rng.choice(self.project_ids)}, headers=self.headers)
+
+    async def task_update(self):
+        if not self.task_ids:
+            return
+        task_id = self.rng.choice(self.task_ids)
+        response = await self.recorder.request(self.client, "GET /tasks/{task_id}", "GET", f"/tasks/{task_id}",
+                                               headers=self.headers)
+        if response is None or response.status_code != 200:
+            return
+        task = response.json()
+        new_status = "in_progress" if task["status"] == "todo" else "todo"
+        await self.recorder.request(
+            self.client, "PUT /tasks/{task_id}", "PUT", f"/tasks/{task_id}",
+            json={"status": new_status},
+            headers={**self.headers, "If-Match": f'"{task.get("version", 1)}"'}
+        )
+
+    async def run(self, deadline: float):
+        names = [name for name, _ in SCENARIO_WEIGHTS]
+        weights = [weight for _, weight in SCENARIO_WEIGHTS]
+        while time.perf_counter() < deadline:
+            scenario = self.rng.choices(names, weights)[0]
+            await getattr(self, scenario)()
+
+@contextlib.asynccontextmanager
+async def make_client(args):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    if args.base_url:
+        async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=30) as client:
+            yield client
+        return
+
+    from dataclasses import replace
+    from src.config import Settings
+    from src.main import create_app
+
+    settings = Settings.from_env()
+    if args.pool_size:
+        settings = replace(settings, pool_size=args.pool_size)
+    app = create_app(settings)
+    # Run startup/shutdown hooks the same way a server would
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=30) as client:
+            yield client
+
+async def run_benchmark(args) -> dict:
+    recorder = Recorder()
+    async with make_client(args) as client:
+        users = [VirtualUser(client, recorder, args, random.Random(args.seed + i)) for i in range(args.concurrency)]
+        await asyncio.gather(*(user.setup() for user in users))
+        # Setup requests are not part of the measurement
+        recorder.latencies.clear()
+        recorder.errors.clear()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user.run(started + args.duration) for user in users))
+        elapsed = time.perf_counter() - started
+    return summarize(recorder, elapsed)
+
+def print_report(summary: dict):
+    print(f"\n{summary['total_requests']} requests in {summary['duration_s']}s "
+          f"({summary['throughput']} req/s)\n")
+    print(f"{'endpoint':<26} {'count':>7} {'err':>5} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for label, stats in summary["endpoints"].items():
+        print(f"{label:<26} {stats['count']:>7} {stats['errors']:>5} {stats['throughput']:>8} "
+              f"{stats['p50_ms']:>8} {stats['p95_ms']:>8} {stats['p99_ms']:>8}")
+
+def compare_to_baseline(summary: dict, baseline: dict, max_regression: float) -> list:
+    """Return a list of human-readable regressions beyond the allowed fraction"""
+    regressions = []
+    if summary["throughput"] < baseline["throughput"] * (1 - max_regression):
+        regressions.append(f"throughput {summary['throughput']} req/s vs baseline {baseline['throughput']} req/s")
+    for label, stats in summary["endpoints"].items():
+        base = baseline.get("endpoints", {}).get(label)
+        if not base:
+            continue
+        if stats["p95_ms"] > base["p95_ms"] * (1 + max_regression):
+            regressions.append(f"{label}: p95 {stats['p95_ms']}ms vs baseline {base['p95_ms']}ms")
+    return regressions
+
+def current_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent HTTP load benchmark")
+    parser.add_argument("--base-url", help="Benchmark a running server instead of the in-process app")
+    parser.add_argument("--concurrency", type=int, default=20, help="Number of concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30.0, help="Measurement time in seconds")
+    parser.add_argument("--email", default="admin@sparkco.com")
+    parser.add_argument("--password", default="admin123")
+    parser.add_argument("--tenant-id", help="Tenant to use (defaults to the user's first tenant)")
+    parser.add_argument("--pool-size", type=int, help="DB pool size for the in-process app (default from env)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save-baseline", help="Write results to this JSON file")
+    parser.add_argument("--baseline", help="Compare results with this baseline JSON file")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Allowed fractional regression of p95 latency / throughput")
+    args = parser.parse_args()
+
+    summary = asyncio.run(run_benchmark(args))
+    summary["commit"] = current_commit()
+    summary["recorded_at"] = datetime.utcnow().isoformat()
+    summary["concurrency"] = args.concurrency
+    print_report(summary)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"\nBaseline written to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(summary, baseline, args.max_regression)
+        if regressions:
+            print(f"\n❌ Regressions vs baseline ({baseline.get('commit', 'unknown')}):")
+            for regression in regressions:
+                print(f"   - {regression}")
+            sys.exit(1)
+        print(f"\n✅ No regressions vs baseline ({baseline.get('commit', 'unknown')})")
+
+if __name__ == "__main__":
+    main()
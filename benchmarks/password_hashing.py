@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Benchmark batch password hashing across process pool sizes.
+
+Hashes the same batch of passwords with 1, 2, 4, ... workers (up to the CPU
+count) and prints throughput and speedup relative to a single core.
+
+Usage:
+    python -m benchmarks.password_hashing --count 200
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.auth import get_password_hashes
+
+def worker_counts(max_workers: int):
+    counts = []
+    workers = 1
+    while workers < max_workers:
+        counts.append(workers)
+        workers *= 2
+    counts.append(max_workers)
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parallel password hashing")
+    parser.add_argument("--count", type=int, default=200, help="Passwords per run")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    passwords = [f"password-{i}" for i in range(args.count)]
+
+    print("=" * 50)
+    print(f"Password hashing benchmark ({args.count} hashes)")
+    print("=" * 50)
+    print(f"{'workers':>8} {'seconds':>10} {'hashes/s':>10} {'speedup':>8}")
+
+    baseline = None
+    for workers in worker_counts(args.max_workers):
+        started = time.perf_counter()
+        hashes = get_password_hashes(passwords, max_workers=workers)
+        elapsed = time.perf_counter() - started
+        assert len(hashes) == len(passwords)
+        if baseline is None:
+            baseline = elapsed
+        print(f"{workers:>8} {elapsed:>10.2f} {args.count / elapsed:>10.1f} {baseline / elapsed:>7.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Admission control and request deadlines.
+
+When the database slows down, requests queue for pool connections and every
+endpoint times out together. This middleware measures load as the larger of
+
+- in-flight requests / ADMISSION_MAX_IN_FLIGHT
+- recent pool checkout wait / ADMISSION_POOL_WAIT_MS
+
+and rejects requests with 503 + Retry-After once the load passes their
+priority's limit, so cheap rejections replace slow failures:
+
+- low    (list and export GETs)            shed at load >= 1.0
+- normal (other reads)                     shed at load >= 1.5
+- high   (POST /auth/login and all writes) shed at load >= 2.0
+
+Health, readiness and metrics endpoints are never shed.
+
+Every admitted request also gets a deadline: REQUEST_TIMEOUT_SECONDS, or
+less if the client sends `X-Request-Timeout: <seconds>`. Export and import
+streams and job result downloads have no deadline. When the deadline passes,
+or the client disconnects before the response is complete, the request's
+work is cancelled: the client gets 504 if no response had started, the
+statement its sessions are running is cancelled in Postgres, and the handler
+is cancelled. FastAPI skips the teardown of yield dependencies on
+cancellation, so the sessions and tenant slots they registered with
+request_resource() are released here, shielded from the cancellation.
+"""
+import math
+import os
+import re
+
+import anyio
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+
+from .metrics import pool_wait_average, requests_shed, request_deadlines
+from .unified_database import (
+    cancel_request_work, release_request_resources, reset_request_resources, use_request_resources
+)
+
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", 100))
+ADMISSION_POOL_WAIT_MS = float(os.getenv("ADMISSION_POOL_WAIT_MS", 100))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", 2))
+REQUEST_TIMEOUT_SECONDS = float(os.getenv("REQUEST_TIMEOUT_SECONDS", 30))
+
+PRIORITY_LIMITS = {"low": 1.0, "normal": 1.5, "high": 2.0}
+
+EXEMPT_PATHS = {"/", "/health", "/livez", "/readyz", "/metrics"}
+NO_DEADLINE_PREFIXES = ("/export", "/import")
+JOB_RESULT_PATH = re.compile(r"^/jobs/[^/]+/result$")
+LOW_PRIORITY_GET = re.compile(
+    r"^/(projects|tasks|users|plans|tenants/plans|tenants/my-tenants|projects/team-members"
+    r"|projects/[^/]+/tasks|tenants/[^/]+/users|export/.*)/?$"
+)
+
+def request_priority(method: str, path: str) -> str:
+    if method not in ("GET", "HEAD", "OPTIONS"):
+        return "high"
+    if LOW_PRIORITY_GET.match(path):
+        return "low"
+    return "normal"
+
+class AdmissionState:
+    """Per-worker count of admitted requests"""
+
+    def __init__(self):
+        self.in_flight = 0
+
+    def load(self) -> float:
+        return max(
+            self.in_flight / ADMISSION_MAX_IN_FLIGHT,
+            pool_wait_average.value * 1000 / ADMISSION_POOL_WAIT_MS
+        )
+
+admission_state = AdmissionState()
+
+def _request_timeout(headers: Headers, path: str) -> float:
+    if path.startswith(NO_DEADLINE_PREFIXES) or JOB_RESULT_PATH.match(path):
+        return math.inf
+    requested = headers.get("x-request-timeout")
+    try:
+        if requested and float(requested) > 0:
+            return min(float(requested), REQUEST_TIMEOUT_SECONDS)
+    except ValueError:
+        pass
+    return REQUEST_TIMEOUT_SECONDS
+
+class AdmissionControlMiddleware:
+    """Sheds low-priority requests under load and enforces per-request deadlines"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        priority = request_priority(scope["method"], scope["path"])
+        load = admission_state.load()
+        if load >= PRIORITY_LIMITS[priority]:
+            requests_shed.inc(priority=priority)
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": "Server is overloaded, please retry later"},
+                headers={"Retry-After": str(ADMISSION_RETRY_AFTER)}
+            )
+            await response(scope, receive, send)
+            return
+
+        admission_state.in_flight += 1
+        try:
+            await self._run_with_deadline(scope, receive, send, _request_timeout(Headers(scope=scope), scope["path"]))
+        finally:
+            admission_state.in_flight -= 1
+
+    async def _run_with_deadline(self, scope, receive, send, timeout: float):
+        response_started = False
+        response_done = False
+        gave_up = False
+        resources = []
+        # Unbuffered: the watcher hands body chunks to the app only as fast as it reads them
+        send_stream, receive_stream = anyio.create_memory_object_stream(0)
+
+        async def send_tracking(message):
+            nonlocal response_started, response_done
+            if gave_up:
+                # The client has its 504 or is gone; drop whatever the app still sends
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                response_done = True
+            await send(message)
+
+        async def app_receive():
+            try:
+                return await receive_stream.receive()
+            except anyio.EndOfStream:
+                # Client went away; let the app see it the usual way
+                return {"type": "http.disconnect"}
+
+        async def give_up(task_group, reason: str):
+            nonlocal gave_up
+            request_deadlines.inc(reason=reason)
+            send_504 = reason == "deadline" and not response_started
+            gave_up = True
+            if send_504:
+                # Shielded: cancelling the app below must not cut the 504 short
+                with anyio.CancelScope(shield=True):
+                    response = JSONResponse(status_code=504, content={"detail": "Request deadline exceeded"})
+                    await response(scope, receive, send)
+            # Sync handlers run in threads that can't be cancelled; stop their SQL instead
+            await run_in_threadpool(cancel_request_work, resources)
+            task_group.cancel_scope.cancel()
+
+        async def watch_client(task_group):
+            # Sole reader of the real receive channel: forwards the body, then waits for a disconnect
+            async with send_stream:
+                while True:
+                    message = await receive()
+                    if message["type"] == "http.disconnect":
+                        if not response_done:
+                            await give_up(task_group, "client_disconnect")
+                        return
+                    await send_stream.send(message)
+
+        async def enforce_deadline(task_group):
+            await anyio.sleep(timeout)
+            if not response_done:
+                await give_up(task_group, "deadline")
+
+        token = use_request_resources(resources)
+        try:
+            async with anyio.create_task_group() as task_group:
+                task_group.start_soon(watch_client, task_group)
+                if timeout != math.inf:
+                    task_group.start_soon(enforce_deadline, task_group)
+                await self.app(scope, app_receive, send_tracking)
+                task_group.cancel_scope.cancel()
+        finally:
+            reset_request_resources(token)
+            # Whatever a cancelled handler's teardown skipped (no-op for resources already released)
+            with anyio.CancelScope(shield=True):
+                await run_in_threadpool(release_request_resources, resources)
@@ -1,22 +1,19 @@
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import List, Optional
+import multiprocessing
 import jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status
 import os
-from dotenv import load_dotenv
+import threading
 
-load_dotenv()
+from .config import get_settings
+from .unified_database import get_database
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-# JWT settings
-SECRET_KEY = os.getenv("JWT_SECRET_KEY")
-ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
-REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", 7))
-
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
     return pwd_context.verify(plain_password, hashed_password)
@@ -25,30 +22,86 @@ def get_password_hash(password: str) -> str:
     """Hash a password"""
     return pwd_context.hash(password)
 
+# Batches smaller than this are hashed inline; process startup would dominate
+PARALLEL_HASH_THRESHOLD = 8
+
+class _HashExecutor:
+    """An app's hashing process pool, started on first use"""
+
+    def __init__(self):
+        self.executor = None
+        self.pid = None
+        self._lock = threading.Lock()
+
+    def get(self) -> ProcessPoolExecutor:
+        with self._lock:
+            # A forked child must not talk to the parent's worker processes
+            if self.executor is None or self.pid != os.getpid():
+                self.executor = ProcessPoolExecutor(
+                    max_workers=os.cpu_count() or 1,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+                self.pid = os.getpid()
+            return self.executor
+
+    def shutdown(self):
+        with self._lock:
+            if self.executor is not None and self.pid == os.getpid():
+                self.executor.shutdown(wait=True)
+            self.executor = None
+
+def _get_hash_executor() -> ProcessPoolExecutor:
+    return get_database().local("hash_executor", _HashExecutor).get()
+
+def get_password_hashes(passwords: List[str], max_workers: Optional[int] = None) -> List[str]:
+    """Hash many passwords in parallel across a process pool (one worker per CPU by default)"""
+    if len(passwords) < PARALLEL_HASH_THRESHOLD or max_workers == 1:
+        return [get_password_hash(password) for password in passwords]
+
+    if max_workers:
+        with ProcessPoolExecutor(max_workers=max_workers,
+                                 mp_context=multiprocessing.get_context("spawn")) as executor:
+            return list(executor.map(get_password_hash, passwords,
+                                     chunksize=max(1, len(passwords) // (max_workers * 4))))
+
+    executor = _get_hash_executor()
+    workers = os.cpu_count() or 1
+    return list(executor.map(get_password_hash, passwords,
+                             chunksize=max(1, len(passwords) // (workers * 4))))
+
+def shutdown_hash_executor():
+    """Stop the current app's hashing process pool (if it was started)"""
+    holder = get_database().drop_local("hash_executor")
+    if holder is not None:
+        holder.shutdown()
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token"""
+    settings = get_settings()
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
-        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        expire = datetime.utcnow() + timedelta(minutes=settings.access_token_expire_minutes)
     
     to_encode.update({"exp": expire, "type": "access"})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, settings.jwt_secret_key, algorithm=settings.jwt_algorithm)
     return encoded_jwt
 
 def create_refresh_token(data: dict):
     """Create JWT refresh token"""
+    settings = get_settings()
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    expire = datetime.utcnow() + timedelta(days=settings.refresh_token_expire_days)
     to_encode.update({"exp": expire, "type": "refresh"})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, settings.jwt_secret_key, algorithm=settings.jwt_algorithm)
     return encoded_jwt
 
 def verify_token(token: str, token_type: str = "access"):
     """Verify JWT token"""
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        settings = get_settings()
+        payload = jwt.decode(token, settings.jwt_secret_key, algorithms=[settings.jwt_algorithm])
         if payload.get("type") != token_type:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -0,0 +1,405 @@
+"""
+Bulk import of tasks and users from CSV files.
+
+Rows are validated in chunks, project and user references are resolved through
+in-memory lookup dicts, valid rows are streamed into a temporary staging table
+with PostgreSQL COPY and then merged into the real table with a single
+INSERT ... SELECT, all in one transaction.
+
+Usage:
+    python -m src.bulk_import tasks tasks.csv --tenant <tenant_uuid> --created-by admin@sparkco.com
+    python -m src.bulk_import users users.csv --tenant <tenant_uuid>
+
+Task columns: title, project (id or name), description, status, priority,
+              assignedTo (email), createdBy (email), dueDate, estimatedHours,
+              actualHours, tags (JSON list or ";"-separated)
+User columns: userName, email, password, firstName, lastName, userRole, avatar,
+              tenantRole
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+import time
+import uuid
+from datetime import datetime
+from sqlalchemy import MetaData, Table, Column, Integer, String, Text, Float, select, insert, delete, exists, or_, func, literal, case
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Session
+
+from .unified_database import SessionLocal, User, Project, Task, TenantUser, get_tenant_by_id, get_user_by_email
+from .unified_models import ImportReport, ImportRowError, TaskStatus, TaskPriority, UserRole, TenantRole
+from .auth import get_password_hashes
+from .usage import add_usage
+from .cache import invalidate_tenant_members
+
+CHUNK_ROWS = 5000
+MAX_REPORTED_ERRORS = 1000
+
+TASK_STATUSES = {s.value for s in TaskStatus}
+TASK_PRIORITIES = {p.value for p in TaskPriority}
+USER_ROLES = {r.value for r in UserRole}
+TENANT_ROLES = {r.value for r in TenantRole}
+
+# Staging tables live only for the import transaction
+_staging_metadata = MetaData()
+
+task_staging = Table(
+    "import_tasks_staging", _staging_metadata,
+    Column("line", Integer),
+    Column("id", UUID(as_uuid=True)),
+    Column("title", String),
+    Column("description", Text),
+    Column("status", String),
+    Column("priority", String),
+    Column("projectId", UUID(as_uuid=True)),
+    Column("assignedToId", UUID(as_uuid=True)),
+    Column("createdById", UUID(as_uuid=True)),
+    Column("dueDate", String),
+    Column("estimatedHours", Float),
+    Column("actualHours", Float),
+    Column("tags", Text),
+    prefixes=["TEMPORARY"],
+    postgresql_on_commit="DROP",
+)
+
+user_staging = Table(
+    "import_users_staging", _staging_metadata,
+    Column("line", Integer),
+    Column("id", UUID(as_uuid=True)),
+    Column("membershipId", UUID(as_uuid=True)),
+    Column("userName", String),
+    Column("email", String),
+    Column("firstName", String),
+    Column("lastName", String),
+    Column("hashedPassword", String),
+    Column("userRole", String),
+    Column("avatar", String),
+    Column("tenantRole", String),
+    prefixes=["TEMPORARY"],
+    postgresql_on_commit="DROP",
+)
+
+def _field(row: dict, name: str):
+    value = row.get(name)
+    if value is None:
+        return None
+    value = value.strip()
+    return value or None
+
+def _float_field(row: dict, name: str):
+    value = _field(row, name)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a number")
+
+def _tags_field(row: dict):
+    value = _field(row, "tags")
+    if value is None:
+        return json.dumps([])
+    if value.startswith("["):
+        try:
+            tags = json.loads(value)
+        except ValueError:
+            raise ValueError("tags is not a valid JSON list")
+        if not isinstance(tags, list):
+            raise ValueError("tags must be a list")
+        return json.dumps([str(tag) for tag in tags])
+    return json.dumps([tag.strip() for tag in value.split(";") if tag.strip()])
+
+def _add_error(report: ImportReport, line: int, message: str):
+    report.rowsFailed += 1
+    if len(report.errors) < MAX_REPORTED_ERRORS:
+        report.errors.append(ImportRowError(line=line, error=message))
+
+def _iter_chunks(reader: csv.DictReader):
+    """Yield lists of (line_number, row) with at most CHUNK_ROWS rows each"""
+    chunk = []
+    for row in reader:
+        chunk.append((reader.line_num, row))
+        if len(chunk) >= CHUNK_ROWS:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _copy_rows(db: Session, table: Table, rows: list):
+    """Stream rows into a staging table with COPY ... FROM STDIN"""
+    if not rows:
+        return
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(["" if value is None else value for value in row])
+    buffer.seek(0)
+
+    columns = ", ".join(f'"{column.name}"' for column in table.columns)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table.name} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+
+def _finish_report(report: ImportReport, started: float) -> ImportReport:
+    report.elapsedSeconds = round(time.perf_counter() - started, 3)
+    if report.elapsedSeconds > 0:
+        report.rowsPerSecond = round(report.rowsImported / report.elapsedSeconds, 1)
+    return report
+
+def _validate_task_row(row: dict, projects: dict, users: dict, default_creator_id):
+    title = _field(row, "title")
+    if not title:
+        raise ValueError("title is required")
+
+    project_ref = _field(row, "project")
+    if not project_ref:
+        raise ValueError("project is required")
+    project_id = projects.get(project_ref, projects.get(project_ref.lower()))
+    if project_id is None:
+        if project_ref.lower() in projects or project_ref in projects:
+            raise ValueError(f"project name '{project_ref}' is ambiguous, use the project id")
+        raise ValueError(f"project '{project_ref}' not found in tenant")
+
+    status = _field(row, "status") or TaskStatus.TODO.value
+    if status not in TASK_STATUSES:
+        raise ValueError(f"invalid status '{status}'")
+    priority = _field(row, "priority") or TaskPriority.MEDIUM.value
+    if priority not in TASK_PRIORITIES:
+        raise ValueError(f"invalid priority '{priority}'")
+
+    assignee_id = None
+    assignee_email = _field(row, "assignedTo")
+    if assignee_email:
+        assignee_id = users.get(assignee_email.lower())
+        if assignee_id is None:
+            raise ValueError(f"assignee '{assignee_email}' not found in tenant")
+
+    creator_id = default_creator_id
+    creator_email = _field(row, "createdBy")
+    if creator_email:
+        creator_id = users.get(creator_email.lower())
+        if creator_id is None:
+            raise ValueError(f"creator '{creator_email}' not found in tenant")
+    if creator_id is None:
+        raise ValueError("createdBy is required")
+
+    return (
+        uuid.uuid4(), title, _field(row, "description"), status, priority,
+        project_id, assignee_id, creator_id, _field(row, "dueDate"),
+        _float_field(row, "estimatedHours"), _float_field(row, "actualHours") or 0.0,
+        _tags_field(row)
+    )
+
+def import_tasks_csv(stream, tenant_id: str, db: Session, created_by_id: str = None) -> ImportReport:
+    """Import tasks for a tenant from a CSV text stream"""
+    started = time.perf_counter()
+    report = ImportReport()
+    tenant_uuid = uuid.UUID(str(tenant_id))
+
+    # Lookup dicts: project id / name -> id, user email -> id (active members of the tenant,
+    # the same access rule as get_tenant_membership; owners and multi-tenant members included)
+    projects = {}
+    for project_id, name in db.query(Project.id, Project.name).filter(Project.tenant_id == tenant_uuid):
+        projects[str(project_id)] = project_id
+        key = name.lower()
+        projects[key] = None if key in projects else project_id  # None marks an ambiguous name
+    users = {
+        email.lower(): user_id
+        for user_id, email in db.query(User.id, User.email).join(TenantUser, TenantUser.userId == User.id).filter(
+            TenantUser.tenantId == tenant_uuid, TenantUser.isActive == True
+        )
+    }
+    default_creator_id = uuid.UUID(str(created_by_id)) if created_by_id else None
+
+    try:
+        task_staging.create(bind=db.connection())
+
+        reader = csv.DictReader(stream)
+        for chunk in _iter_chunks(reader):
+            valid_rows = []
+            for line, row in chunk:
+                report.rowsRead += 1
+                try:
+                    valid_rows.append((line,) + _validate_task_row(row, projects, users, default_creator_id))
+                except ValueError as e:
+                    _add_error(report, line, str(e))
+            _copy_rows(db, task_staging, valid_rows)
+
+        now = datetime.utcnow()
+        staged = task_staging.c
+        result = db.execute(
+            insert(Task.__table__).from_select(
+                ["id", "tenant_id", "title", "description", "status", "priority", "projectId",
+                 "assignedToId", "createdById", "dueDate", "estimatedHours", "actualHours",
+                 "tags", "completedAt", "version", "createdAt", "updatedAt"],
+                select(
+                    staged.id, literal(tenant_uuid, UUID(as_uuid=True)), staged.title, staged.description,
+                    staged.status, staged.priority, staged.projectId, staged.assignedToId,
+                    staged.createdById, staged.dueDate, staged.estimatedHours, staged.actualHours,
+                    staged.tags,
+                    case((staged.status == TaskStatus.COMPLETED.value, literal(now)), else_=None),
+                    literal(1), literal(now), literal(now)
+                )
+            )
+        )
+        report.rowsImported = result.rowcount
+        add_usage(db, tenant_uuid, tasks=result.rowcount)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return _finish_report(report, started)
+
+def _validate_user_row(row: dict, seen_emails: set, seen_usernames: set):
+    user_name = _field(row, "userName")
+    email = _field(row, "email")
+    password = _field(row, "password")
+    if not user_name:
+        raise ValueError("userName is required")
+    if not email or "@" not in email:
+        raise ValueError("a valid email is required")
+    if not password:
+        raise ValueError("password is required")
+
+    email = email.lower()
+    if email in seen_emails:
+        raise ValueError(f"duplicate email '{email}' in file")
+    if user_name in seen_usernames:
+        raise ValueError(f"duplicate userName '{user_name}' in file")
+
+    user_role = _field(row, "userRole") or UserRole.TEAM_MEMBER.value
+    if user_role not in USER_ROLES:
+        raise ValueError(f"invalid userRole '{user_role}'")
+    tenant_role = _field(row, "tenantRole") or TenantRole.MEMBER.value
+    if tenant_role not in TENANT_ROLES:
+        raise ValueError(f"invalid tenantRole '{tenant_role}'")
+
+    seen_emails.add(email)
+    seen_usernames.add(user_name)
+    return (
+        user_name, email, _field(row, "firstName"), _field(row, "lastName"),
+        password, user_role, _field(row, "avatar"), tenant_role
+    )
+
+def import_users_csv(stream, tenant_id: str, db: Session) -> ImportReport:
+    """Import users (and their tenant memberships) for a tenant from a CSV text stream"""
+    started = time.perf_counter()
+    report = ImportReport()
+    tenant_uuid = uuid.UUID(str(tenant_id))
+    seen_emails = set()
+    seen_usernames = set()
+
+    try:
+        user_staging.create(bind=db.connection())
+
+        reader = csv.DictReader(stream)
+        for chunk in _iter_chunks(reader):
+            validated = []
+            for line, row in chunk:
+                report.rowsRead += 1
+                try:
+                    validated.append((line, _validate_user_row(row, seen_emails, seen_usernames)))
+                except ValueError as e:
+                    _add_error(report, line, str(e))
+
+            hashes = get_password_hashes([values[4] for _, values in validated])
+            _copy_rows(db, user_staging, [
+                (line, uuid.uuid4(), uuid.uuid4(), user_name, email, first_name, last_name,
+                 hashed, user_role, avatar, tenant_role)
+                for (line, (user_name, email, first_name, last_name, _, user_role, avatar, tenant_role)), hashed
+                in zip(validated, hashes)
+            ])
+
+        staged = user_staging.c
+        users = User.__table__.c
+
+        # Rows clashing with existing accounts are reported and dropped before the merge
+        conflict = exists().where(or_(
+            func.lower(users.email) == staged.email,
+            users.userName == staged.userName
+        ))
+        for line, email in db.execute(select(staged.line, staged.email).where(conflict)):
+            _add_error(report, line, f"user '{email}' already exists")
+        db.execute(delete(user_staging).where(conflict))
+
+        now = datetime.utcnow()
+        db.execute(
+            insert(User.__table__).from_select(
+                ["id", "tenant_id", "userName", "email", "firstName", "lastName",
+                 "hashedPassword", "userRole", "avatar", "isActive", "createdAt", "updatedAt"],
+                select(
+                    staged.id, literal(tenant_uuid, UUID(as_uuid=True)), staged.userName, staged.email,
+                    staged.firstName, staged.lastName, staged.hashedPassword, staged.userRole,
+                    staged.avatar, literal(True), literal(now), literal(now)
+                )
+            )
+        )
+        result = db.execute(
+            insert(TenantUser.__table__).from_select(
+                ["id", "tenantId", "userId", "role", "permissions", "isActive",
+                 "joinedAt", "createdAt", "updatedAt"],
+                select(
+                    staged.membershipId, literal(tenant_uuid, UUID(as_uuid=True)), staged.id,
+                    staged.tenantRole, literal([], TenantUser.__table__.c.permissions.type),
+                    literal(True), literal(now), literal(now), literal(now)
+                )
+            )
+        )
+        report.rowsImported = result.rowcount
+        add_usage(db, tenant_uuid, users=result.rowcount)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    if report.rowsImported:
+        # Every member's tenant switcher shows the new user count
+        invalidate_tenant_members(tenant_uuid, db)
+
+    return _finish_report(report, started)
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Bulk import tasks or users from CSV")
+    parser.add_argument("kind", choices=["tasks", "users"])
+    parser.add_argument("path", help="CSV file to import")
+    parser.add_argument("--tenant", required=True, help="Tenant UUID to import into")
+    parser.add_argument("--created-by", help="Email of the default task creator (tasks only)")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if not get_tenant_by_id(args.tenant, db):
+            print(f"❌ Tenant {args.tenant} not found")
+            sys.exit(1)
+
+        with open(args.path, newline="", encoding="utf-8") as stream:
+            if args.kind == "tasks":
+                created_by_id = None
+                if args.created_by:
+                    creator = get_user_by_email(args.created_by, db)
+                    if not creator:
+                        print(f"❌ User {args.created_by} not found")
+                        sys.exit(1)
+                    created_by_id = creator.id
+                report = import_tasks_csv(stream, args.tenant, db, created_by_id=created_by_id)
+            else:
+                report = import_users_csv(stream, args.tenant, db)
+    finally:
+        db.close()
+
+    print(f"Rows read:     {report.rowsRead}")
+    print(f"Rows imported: {report.rowsImported}")
+    print(f"Rows failed:   {report.rowsFailed}")
+    print(f"Elapsed:       {report.elapsedSeconds:.2f}s ({report.rowsPerSecond:.0f} rows/s)")
+    for error in report.errors:
+        print(f"  line {error.line}: {error.error}")
+    if report.rowsFailed > len(report.errors):
+        print(f"  ... and {report.rowsFailed - len(report.errors)} more errors")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Small in-process TTL caches for data that is read on most requests but rarely
+changes (plans, tenant details). Each worker has its own copy, and within a
+worker each app (Database) has its own, dropped when the app shuts down;
+entries expire after their TTL, and writers call invalidate() so the local
+worker sees its own changes immediately. Hits and misses are counted in
+cache_requests_total.
+"""
+import os
+import threading
+import time
+
+from .metrics import record_cache_hit, record_cache_miss
+from .unified_database import DatabaseLocal, TenantUser
+
+class TTLCache:
+    """Thread-safe dict with per-entry expiry and a size cap (oldest entries are dropped first)"""
+
+    def __init__(self, name: str, ttl_seconds: float, max_entries: int = 10000):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            record_cache_hit(self.name)
+            return entry[1]
+        record_cache_miss(self.name)
+        return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            while len(self._entries) > self.max_entries:
+                del self._entries[next(iter(self._entries))]
+
+    def get_or_load(self, key, loader):
+        """Return the cached value or call loader() and cache its result (None is not cached)"""
+        value = self.get(key)
+        if value is None:
+            value = loader()
+            if value is not None:
+                self.set(key, value)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+def app_cache(name: str, ttl_seconds: float, max_entries: int = 10000) -> DatabaseLocal:
+    """A TTLCache per app, used like a module-level TTLCache"""
+    return DatabaseLocal(f"cache:{name}", lambda: TTLCache(name, ttl_seconds, max_entries))
+
+# Serialized PlansResponse for GET /plans and GET /tenants/plans
+plans_cache = app_cache("plans", float(os.getenv("PLANS_CACHE_TTL", 300)), max_entries=16)
+
+# Tenant detail dicts keyed by tenant id
+tenant_cache = app_cache("tenants", float(os.getenv("TENANT_CACHE_TTL", 60)))
+
+# Tenant switcher payload (GET /tenants/my-tenants) keyed by user id
+my_tenants_cache = app_cache("my_tenants", float(os.getenv("MY_TENANTS_CACHE_TTL", 60)))
+
+def invalidate_tenant_members(tenant_id, db):
+    """Drop the switcher entries of every member of a tenant whose members or usage changed"""
+    for (user_id,) in db.query(TenantUser.userId).filter(TenantUser.tenantId == tenant_id):
+        my_tenants_cache.invalidate(str(user_id))
@@ -0,0 +1,76 @@
+"""
+Process configuration.
+
+`.env` is loaded here and only here, so other modules can read os.environ
+without each calling load_dotenv() at import time.
+
+Settings holds everything the app factory needs (database pool, JWT, CORS).
+create_app() installs its Settings for the duration of each request;
+get_settings() returns those, or settings read from the environment when no
+app is active (scripts, CLIs).
+"""
+import contextvars
+import os
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+@dataclass
+class Settings:
+    database_url: Optional[str] = None
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: float = 30.0
+    pool_recycle: int = -1
+    jwt_secret_key: Optional[str] = None
+    jwt_algorithm: str = "HS256"
+    access_token_expire_minutes: int = 30
+    refresh_token_expire_days: int = 7
+    cors_origins: List[str] = field(default_factory=lambda: ["*"])
+    log_level: str = "INFO"
+    warmup: bool = True
+    job_workers: int = 2  # in-process job worker threads; 0 when `python -m src.jobs worker` runs them
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        return cls(
+            database_url=os.getenv("DATABASE_URL"),
+            pool_size=_env_int("DB_POOL_SIZE", 5),
+            max_overflow=_env_int("DB_MAX_OVERFLOW", 10),
+            pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", 30)),
+            pool_recycle=_env_int("DB_POOL_RECYCLE", -1),
+            jwt_secret_key=os.getenv("JWT_SECRET_KEY"),
+            jwt_algorithm=os.getenv("JWT_ALGORITHM", "HS256"),
+            access_token_expire_minutes=_env_int("ACCESS_TOKEN_EXPIRE_MINUTES", 30),
+            refresh_token_expire_days=_env_int("REFRESH_TOKEN_EXPIRE_DAYS", 7),
+            cors_origins=[origin.strip() for origin in os.getenv("CORS_ORIGINS", "*").split(",") if origin.strip()],
+            log_level=os.getenv("LOG_LEVEL", "INFO"),
+            warmup=os.getenv("WARMUP", "true").lower() not in ("0", "false", "no"),
+            job_workers=_env_int("JOB_WORKERS", 2),
+        )
+
+_current_settings = contextvars.ContextVar("current_settings", default=None)
+_env_settings = None
+
+def get_settings() -> Settings:
+    """Settings of the app serving the current request, else from the environment"""
+    global _env_settings
+    settings = _current_settings.get()
+    if settings is not None:
+        return settings
+    if _env_settings is None:
+        _env_settings = Settings.from_env()
+    return _env_settings
+
+def use_settings(settings: Settings):
+    """Make `settings` current in this context; returns a token for reset_settings()"""
+    return _current_settings.set(settings)
+
+def reset_settings(token):
+    _current_settings.reset(token)
@@ -0,0 +1,188 @@
+"""
+Database timing instrumentation.
+
+Records the duration of every SQL statement through engine events and keeps a
+per-request summary (query count, total DB time) that is returned to clients
+as a `Server-Timing` header and logged as structured fields. Statements slower
+than SLOW_QUERY_MS are logged with their route and tenant; a sampled fraction
+of slow SELECTs (SLOW_QUERY_EXPLAIN_RATE) also logs the EXPLAIN plan.
+Statements that fail (including statement_timeout cancellations) are timed,
+counted and logged the same way, with the error.
+"""
+import contextvars
+import logging
+import os
+import random
+import time
+
+from sqlalchemy import event
+from starlette.datastructures import Headers, MutableHeaders
+
+logger = logging.getLogger("sparkco.db")
+request_logger = logging.getLogger("sparkco.requests")
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 200))
+SLOW_QUERY_EXPLAIN_RATE = float(os.getenv("SLOW_QUERY_EXPLAIN_RATE", 0))
+
+class RequestDbStats:
+    """Mutable per-request counters; shared with worker threads through a context variable"""
+    __slots__ = ("scope", "query_count", "db_ms")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.query_count = 0
+        self.db_ms = 0.0
+
+    @property
+    def route(self) -> str:
+        route = self.scope.get("route")
+        return getattr(route, "path", None) or self.scope.get("path", "")
+
+    @property
+    def tenant_id(self):
+        return Headers(scope=self.scope).get("x-tenant-id")
+
+_current_stats = contextvars.ContextVar("request_db_stats", default=None)
+
+def current_request_stats():
+    return _current_stats.get()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("query_started")
+    if not started:
+        return
+    elapsed_ms = (time.perf_counter() - started.pop()) * 1000
+
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.query_count += 1
+        stats.db_ms += elapsed_ms
+
+    if elapsed_ms >= SLOW_QUERY_MS:
+        _log_slow_query(conn, statement, parameters, elapsed_ms, stats, executemany)
+
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    # Only errors raised while a statement ran have a start time to pop
+    if conn is None or exception_context.execution_context is None:
+        return None
+    started = conn.info.get("query_started")
+    if not started:
+        return None
+    elapsed_ms = (time.perf_counter() - started.pop()) * 1000
+
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.query_count += 1
+        stats.db_ms += elapsed_ms
+
+    error = exception_context.original_exception
+    fields = {
+        "duration_ms": round(elapsed_ms, 1),
+        "route": stats.route if stats else None,
+        "tenant_id": stats.tenant_id if stats else None,
+        "statement": exception_context.statement,
+        "error": f"{type(error).__name__}: {error}".strip(),
+    }
+    logger.warning(
+        "failed query %.1fms route=%s tenant=%s error=%s: %s",
+        elapsed_ms, fields["route"], fields["tenant_id"], type(error).__name__,
+        " ".join((exception_context.statement or "").split()),
+        extra=fields
+    )
+    return None
+
+def _log_slow_query(conn, statement, parameters, elapsed_ms, stats, executemany):
+    fields = {
+        "duration_ms": round(elapsed_ms, 1),
+        "route": stats.route if stats else None,
+        "tenant_id": stats.tenant_id if stats else None,
+        "statement": statement,
+    }
+    if (SLOW_QUERY_EXPLAIN_RATE and not executemany
+            and statement.lstrip().upper().startswith("SELECT")
+            and random.random() < SLOW_QUERY_EXPLAIN_RATE):
+        fields["plan"] = _explain(conn, statement, parameters)
+    logger.warning(
+        "slow query %.1fms route=%s tenant=%s: %s",
+        elapsed_ms, fields["route"], fields["tenant_id"], " ".join(statement.split()),
+        extra=fields
+    )
+    if fields.get("plan"):
+        logger.warning("slow query plan:\n%s", fields["plan"], extra=fields)
+
+def _explain(conn, statement, parameters):
+    """Run EXPLAIN inside a savepoint so a failure cannot abort the caller's transaction"""
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute("SAVEPOINT slow_query_explain")
+        try:
+            cursor.execute("EXPLAIN " + statement, parameters)
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+            cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+            return plan
+        except Exception as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+            return f"EXPLAIN failed: {e}"
+    except Exception:
+        return None
+    finally:
+        cursor.close()
+
+def install_query_instrumentation(engine):
+    """Attach the timing listeners to an engine (idempotent)"""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+
+class RequestTimingMiddleware:
+    """Adds Server-Timing headers and a structured log line with DB totals to every request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestDbStats(scope)
+        token = _current_stats.set(stats)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                total_ms = (time.perf_counter() - started) * 1000
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Server-Timing",
+                    f'db;dur={stats.db_ms:.1f};desc="{stats.query_count} queries", app;dur={total_ms:.1f}'
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_stats.reset(token)
+            duration_ms = (time.perf_counter() - started) * 1000
+            request_logger.info(
+                "%s %s status=%s duration_ms=%.1f db_queries=%d db_ms=%.1f tenant=%s",
+                scope["method"], stats.route, status_code, duration_ms,
+                stats.query_count, stats.db_ms, stats.tenant_id,
+                extra={
+                    "method": scope["method"],
+                    "route": stats.route,
+                    "status": status_code,
+                    "duration_ms": round(duration_ms, 1),
+                    "db_queries": stats.query_count,
+                    "db_ms": round(stats.db_ms, 1),
+                    "tenant_id": stats.tenant_id,
+                }
+            )
@@ -1,12 +1,24 @@
-from fastapi import Depends, HTTPException, status, Header
+from fastapi import Depends, HTTPException, status, Header, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from .auth import verify_token
-from .unified_database import get_db, get_user_by_email, get_user_tenants, get_tenant_by_id
+from .unified_database import get_db, get_user_by_email, get_tenant_membership
+from .tracing import traced
+from .rate_limit import check_tenant_rate_limit, tenant_slot
+from .tenant_db_guard import guard_tenant_session
+from .subscriptions import check_subscription_allows
 from sqlalchemy.orm import Session
 from typing import Optional
 
-security = HTTPBearer()
+class TracedHTTPBearer(HTTPBearer):
+    """HTTPBearer with a span; a subclass, so OpenAPI still lists it as a security scheme"""
 
+    @traced("HTTPBearer")
+    async def __call__(self, request: Request):
+        return await super().__call__(request)
+
+security = TracedHTTPBearer()
+
+@traced()
 def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
@@ -28,37 +40,64 @@ def get_current_user(
         )
     return user
 
+@traced()
 def get_tenant_context(
+    request: Request,
     x_tenant_id: Optional[str] = Header(None),
     current_user = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get tenant context from header and verify user access"""
+    """Get tenant context from header, verify user access and subscription, and apply the tenant's rate limits"""
     if not x_tenant_id:
         # For non-tenant specific endpoints, return None
-        return None
+        yield None
+        return
     
-    # Verify tenant exists
-    tenant = get_tenant_by_id(x_tenant_id, db)
-    if not tenant:
+    # Verify tenant exists and user has access to it (single query)
+    membership = get_tenant_membership(x_tenant_id, str(current_user.id), db)
+    if not membership:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Tenant not found"
         )
     
-    # Verify user has access to this tenant
-    user_tenants = get_user_tenants(str(current_user.id), db)
-    user_tenant = next((tu for tu in user_tenants if str(tu.tenantId) == x_tenant_id), None)
-    
+    tenant, user_tenant, plan_type = membership
     if not user_tenant:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Access denied to this tenant"
         )
+    # Verified from here on; metrics label requests with it (never with the raw header)
+    request.state.tenant_id = str(tenant.id)
     
-    return {
-        "tenant": tenant,
-        "user_role": user_tenant.role,
-        "permissions": user_tenant.permissions,
-        "tenant_id": x_tenant_id
-    }
\ No newline at end of file
+    # Writes need a live subscription (cached state, no query on a hit)
+    check_subscription_allows(x_tenant_id, request.method, db)
+    # Takes the bucket on this request's session; no second pool connection
+    check_tenant_rate_limit(x_tenant_id, plan_type, db)
+    # Slot is held until the endpoint has finished (fair queuing mode)
+    with tenant_slot(x_tenant_id, plan_type):
+        # Plan-based statement_timeout and DB session cap for the rest of the request
+        guard_tenant_session(db, x_tenant_id, plan_type)
+        yield {
+            "tenant": tenant,
+            "user_role": user_tenant.role,
+            "permissions": user_tenant.permissions,
+            "plan_type": plan_type,
+            "tenant_id": x_tenant_id
+        }
+
+@traced()
+def get_if_match_version(if_match: Optional[str] = Header(None)) -> Optional[int]:
+    """Parse the expected row version from an If-Match header (e.g. "3" or W/"3")"""
+    if not if_match:
+        return None
+    value = if_match.strip()
+    if value.startswith("W/"):
+        value = value[2:]
+    value = value.strip('"')
+    if not value.isdigit():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="If-Match must contain a numeric version"
+        )
+    return int(value)
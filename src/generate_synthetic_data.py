@@ -0,0 +1,248 @@
+"""
+Synthetic large-scale data generator for benchmarking.
+
+Creates many tenants with production-like skew: tenant sizes follow a Pareto
+distribution, so a few tenants are huge and most form a long tail. The
+--users-per-tenant, --projects and --tasks options are per-tenant averages.
+Rows are bulk-loaded with set-based multi-row INSERTs, every user shares one
+precomputed password hash, and the output is fully deterministic for a seed.
+
+Usage:
+1. Make sure your .env file has the correct DATABASE_URL
+2. Run: python -m src.generate_synthetic_data --tenants 500 --users-per-tenant 50 --projects 200 --tasks 5000 --seed 42
+
+All generated users have the password "password123".
+"""
+import argparse
+import json
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+
+from .unified_database import (
+    SessionLocal, create_tables, Tenant, Plan, Subscription, TenantUser,
+    User, Project, Task, project_team_members
+)
+from .unified_models import (
+    UserRole, ProjectStatus, ProjectPriority, TaskStatus, TaskPriority,
+    PlanType, SubscriptionStatus, TenantRole
+)
+from .auth import get_password_hash
+
+# Rows are sent to the database once this many are buffered for a table
+BATCH_ROWS = 5000
+
+# Fixed anchor so timestamps are reproducible
+BASE_DATE = datetime(2024, 1, 1)
+
+TASK_STATUS_WEIGHTS = [
+    (TaskStatus.TODO.value, 35),
+    (TaskStatus.IN_PROGRESS.value, 25),
+    (TaskStatus.COMPLETED.value, 35),
+    (TaskStatus.CANCELLED.value, 5),
+]
+PROJECT_STATUS_WEIGHTS = [
+    (ProjectStatus.PLANNING.value, 15),
+    (ProjectStatus.IN_PROGRESS.value, 50),
+    (ProjectStatus.ON_HOLD.value, 10),
+    (ProjectStatus.COMPLETED.value, 20),
+    (ProjectStatus.CANCELLED.value, 5),
+]
+PRIORITIES = [p.value for p in TaskPriority]
+TAGS = ["backend", "frontend", "design", "qa", "devops", "docs", "bug", "feature", "research", "urgent"]
+
+FALLBACK_PLANS = [
+    {"name": "Starter", "planType": PlanType.STARTER.value, "price": 29.0, "maxProjects": 10, "maxUsers": 5},
+    {"name": "Professional", "planType": PlanType.PROFESSIONAL.value, "price": 79.0, "maxProjects": 50, "maxUsers": 25},
+    {"name": "Enterprise", "planType": PlanType.ENTERPRISE.value, "price": 199.0, "maxProjects": None, "maxUsers": None},
+]
+
+class BulkWriter:
+    """Buffers rows per table and writes them with multi-row INSERTs"""
+
+    def __init__(self, db):
+        self.db = db
+        self.buffers = {}
+        self.counts = {}
+        # Parents must be written before children because of foreign keys
+        self.order = [
+            Tenant.__table__, Subscription.__table__, User.__table__, TenantUser.__table__,
+            Project.__table__, project_team_members, Task.__table__
+        ]
+
+    def add(self, table, row: dict):
+        self.buffers.setdefault(table, []).append(row)
+        if len(self.buffers[table]) >= BATCH_ROWS:
+            self.flush()
+
+    def flush(self):
+        for table in self.order:
+            rows = self.buffers.get(table)
+            if rows:
+                self.db.execute(insert(table), rows)
+                self.counts[table.name] = self.counts.get(table.name, 0) + len(rows)
+                self.buffers[table] = []
+        self.db.commit()
+
+def _uuid(rng: random.Random) -> uuid.UUID:
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+def _timestamp(rng: random.Random) -> datetime:
+    return BASE_DATE + timedelta(seconds=rng.randrange(365 * 24 * 3600))
+
+def _weighted(rng: random.Random, weights):
+    return rng.choices([value for value, _ in weights], [weight for _, weight in weights])[0]
+
+def tenant_size_factors(rng: random.Random, tenants: int, skew: float):
+    """Pareto-distributed size factors normalized to a mean of 1"""
+    raw = [rng.paretovariate(skew) for _ in range(tenants)]
+    mean = sum(raw) / len(raw)
+    return [value / mean for value in raw]
+
+def _ensure_plans(db):
+    plans = db.query(Plan).filter(Plan.isActive == True).all()
+    if plans:
+        return plans
+    for plan_data in FALLBACK_PLANS:
+        db.add(Plan(description=f"{plan_data['name']} plan", billingCycle="monthly", features=[], **plan_data))
+    db.commit()
+    return db.query(Plan).all()
+
+def _plan_for_size(plans, factor: float):
+    by_type = {plan.planType: plan for plan in plans}
+    if factor >= 3:
+        return by_type.get(PlanType.ENTERPRISE.value, plans[-1])
+    if factor >= 0.75:
+        return by_type.get(PlanType.PROFESSIONAL.value, plans[0])
+    return by_type.get(PlanType.STARTER.value, plans[0])
+
+def generate(tenants: int, users_per_tenant: int, projects: int, tasks: int,
+             seed: int = 42, skew: float = 1.16, prefix: str = "synthetic"):
+    rng = random.Random(seed)
+    hashed_password = get_password_hash("password123")
+
+    db = SessionLocal()
+    try:
+        plans = _ensure_plans(db)
+        writer = BulkWriter(db)
+        started = time.perf_counter()
+
+        for tenant_index, factor in enumerate(tenant_size_factors(rng, tenants, skew)):
+            tenant_id = _uuid(rng)
+            created_at = _timestamp(rng)
+            slug = f"{prefix}-{seed}-{tenant_index}"
+            writer.add(Tenant.__table__, {
+                "id": tenant_id, "name": f"Synthetic Tenant {tenant_index}", "domain": slug,
+                "description": "Generated for benchmarking", "settings": {}, "isActive": True,
+                "createdAt": created_at, "updatedAt": created_at
+            })
+            writer.add(Subscription.__table__, {
+                "id": _uuid(rng), "tenantId": tenant_id, "planId": _plan_for_size(plans, factor).id,
+                "status": SubscriptionStatus.ACTIVE.value, "startDate": created_at,
+                "endDate": created_at + timedelta(days=365), "autoRenew": True,
+                "createdAt": created_at, "updatedAt": created_at
+            })
+
+            # Users (the first one owns the tenant)
+            user_ids = []
+            for user_index in range(max(1, round(users_per_tenant * factor))):
+                user_id = _uuid(rng)
+                user_ids.append(user_id)
+                role = UserRole.PROJECT_MANAGER.value if user_index % 10 == 0 else UserRole.TEAM_MEMBER.value
+                writer.add(User.__table__, {
+                    "id": user_id, "tenant_id": tenant_id,
+                    "userName": f"{slug}-user{user_index}",
+                    "email": f"user{user_index}@{slug}.example.com",
+                    "firstName": f"User{user_index}", "lastName": f"Tenant{tenant_index}",
+                    "hashedPassword": hashed_password, "userRole": role, "avatar": None,
+                    "isActive": True, "createdAt": created_at, "updatedAt": created_at
+                })
+                writer.add(TenantUser.__table__, {
+                    "id": _uuid(rng), "tenantId": tenant_id, "userId": user_id,
+                    "role": TenantRole.OWNER.value if user_index == 0 else TenantRole.MEMBER.value,
+                    "permissions": ["*"] if user_index == 0 else [], "isActive": True,
+                    "invitedBy": None, "joinedAt": created_at,
+                    "createdAt": created_at, "updatedAt": created_at
+                })
+
+            # Projects with a few team members each
+            project_ids = []
+            for project_index in range(max(1, round(projects * factor))):
+                project_id = _uuid(rng)
+                project_ids.append(project_id)
+                project_created = _timestamp(rng)
+                writer.add(Project.__table__, {
+                    "id": project_id, "tenant_id": tenant_id, "name": f"Project {project_index}",
+                    "description": f"Synthetic project {project_index}",
+                    "status": _weighted(rng, PROJECT_STATUS_WEIGHTS),
+                    "priority": rng.choice([p.value for p in ProjectPriority]),
+                    "startDate": project_created.date().isoformat(),
+                    "endDate": (project_created + timedelta(days=rng.randint(14, 180))).date().isoformat(),
+                    "completionPercent": rng.randint(0, 100), "budget": float(rng.randint(1, 500) * 1000),
+                    "actualCost": 0.0, "projectManagerId": rng.choice(user_ids), "notes": None,
+                    "version": 1, "createdAt": project_created, "updatedAt": project_created
+                })
+                for member_id in rng.sample(user_ids, min(len(user_ids), rng.randint(2, 6))):
+                    writer.add(project_team_members, {"project_id": project_id, "user_id": member_id})
+
+            # Tasks spread over the tenant's projects
+            for task_index in range(max(1, round(tasks * factor))):
+                task_created = _timestamp(rng)
+                status = _weighted(rng, TASK_STATUS_WEIGHTS)
+                writer.add(Task.__table__, {
+                    "id": _uuid(rng), "tenant_id": tenant_id, "title": f"Task {task_index}",
+                    "description": None, "status": status, "priority": rng.choice(PRIORITIES),
+                    "projectId": rng.choice(project_ids),
+                    "assignedToId": rng.choice(user_ids) if rng.random() < 0.9 else None,
+                    "createdById": rng.choice(user_ids),
+                    "dueDate": (task_created + timedelta(days=rng.randint(1, 60))).date().isoformat(),
+                    "estimatedHours": float(rng.randint(1, 40)), "actualHours": 0.0,
+                    "tags": json.dumps(rng.sample(TAGS, rng.randint(0, 3))),
+                    "completedAt": task_created + timedelta(days=rng.randint(1, 30)) if status == TaskStatus.COMPLETED.value else None,
+                    "version": 1, "createdAt": task_created, "updatedAt": task_created
+                })
+
+            if (tenant_index + 1) % 50 == 0:
+                print(f"  ... {tenant_index + 1}/{tenants} tenants generated")
+
+        writer.flush()
+        elapsed = time.perf_counter() - started
+    finally:
+        db.close()
+
+    total_rows = sum(writer.counts.values())
+    print(f"\nInserted {total_rows} rows in {elapsed:.1f}s ({total_rows / max(elapsed, 1e-9):.0f} rows/s)")
+    for table in writer.order:
+        print(f"  - {table.name}: {writer.counts.get(table.name, 0)}")
+
+def main():
+    """Main function to run the generator"""
+    parser = argparse.ArgumentParser(description="Generate production-shaped synthetic data")
+    parser.add_argument("--tenants", type=int, default=10)
+    parser.add_argument("--users-per-tenant", type=int, default=20, help="Average users per tenant")
+    parser.add_argument("--projects", type=int, default=20, help="Average projects per tenant")
+    parser.add_argument("--tasks", type=int, default=500, help="Average tasks per tenant")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skew", type=float, default=1.16,
+                        help="Pareto shape for tenant sizes (lower = more skewed; 1.16 is roughly 80/20)")
+    parser.add_argument("--prefix", default="synthetic", help="Prefix for generated tenant domains")
+    args = parser.parse_args()
+
+    print("=" * 50)
+    print("SparkCo ERP Synthetic Data Generator")
+    print("=" * 50)
+    try:
+        create_tables()
+        generate(args.tenants, args.users_per_tenant, args.projects, args.tasks,
+                 seed=args.seed, skew=args.skew, prefix=args.prefix)
+    except Exception as e:
+        print(f"\n❌ Error generating data: {e}")
+        print("Make sure your DATABASE_URL is correctly set in the .env file")
+        print("and that the seed/prefix combination has not been generated before.")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
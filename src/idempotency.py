@@ -0,0 +1,204 @@
+"""
+Idempotency-Key support for retried POST requests.
+
+Clients that retry POST /tasks, POST /projects or POST /tenants/subscribe after a
+timeout can send an `Idempotency-Key` header. The first request with a given key
+claims it in the `idempotency_keys` table and its response is stored; retries are
+answered from the stored response without running the handler again. A retry that
+arrives while the original is still running gets 409 instead of a duplicate write.
+
+The claim is refreshed every IDEMPOTENCY_LOCK_SECONDS / 3 while the handler
+runs, so only a claim whose worker died (no refresh for IDEMPOTENCY_LOCK_SECONDS)
+is taken over. Storing or releasing the key at the end is shielded from
+cancellation, so a key is never left in progress by a cancelled request.
+"""
+import hashlib
+import logging
+import os
+
+import anyio
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse, Response
+
+from .auth import verify_token
+from .unified_database import (
+    SessionLocal, claim_idempotency_key, complete_idempotency_key, refresh_idempotency_key,
+    release_idempotency_key
+)
+
+logger = logging.getLogger("sparkco.requests")
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", 24 * 60 * 60))
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", 60))
+MAX_KEY_LENGTH = 255
+
+IDEMPOTENT_ROUTES = {
+    ("POST", "/tasks"),
+    ("POST", "/projects"),
+    ("POST", "/tenants/subscribe"),
+}
+
+def _request_scope(headers: Headers):
+    """Scope keys to the authenticated user and tenant so keys never collide across callers"""
+    authorization = headers.get("authorization", "")
+    if not authorization.lower().startswith("bearer "):
+        return None
+    try:
+        payload = verify_token(authorization[7:], "access")
+    except HTTPException:
+        return None
+    if not payload.get("sub"):
+        return None
+    return f"{payload['sub']}|{headers.get('x-tenant-id', '')}"
+
+def _claim(scope: str, key: str, request_hash: str):
+    db = SessionLocal()
+    try:
+        record, claimed = claim_idempotency_key(
+            scope, key, request_hash, IDEMPOTENCY_TTL_SECONDS, db,
+            lock_timeout_seconds=IDEMPOTENCY_LOCK_SECONDS
+        )
+        if record is None:
+            return None, False
+        return {
+            "id": record.id,
+            "requestHash": record.requestHash,
+            "status": record.status,
+            "responseStatus": record.responseStatus,
+            "responseContentType": record.responseContentType,
+            "responseBody": record.responseBody,
+        }, claimed
+    finally:
+        db.close()
+
+def _complete(record_id, status_code: int, content_type, body: bytes):
+    db = SessionLocal()
+    try:
+        complete_idempotency_key(record_id, status_code, content_type, body, db)
+    finally:
+        db.close()
+
+def _refresh(record_id):
+    db = SessionLocal()
+    try:
+        refresh_idempotency_key(record_id, db)
+    finally:
+        db.close()
+
+def _release(record_id):
+    db = SessionLocal()
+    try:
+        release_idempotency_key(record_id, db)
+    finally:
+        db.close()
+
+class IdempotencyMiddleware:
+    """Pure ASGI middleware so the request body can be buffered and replayed safely"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (scope["method"], scope["path"].rstrip("/") or "/") not in IDEMPOTENT_ROUTES:
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        key = headers.get("idempotency-key")
+        owner = _request_scope(headers) if key else None
+        if owner is None:
+            # No key, or unauthenticated (the route itself will reject it)
+            await self.app(scope, receive, send)
+            return
+
+        if len(key) > MAX_KEY_LENGTH:
+            response = JSONResponse({"detail": "Idempotency-Key is too long"}, status_code=400)
+            await response(scope, receive, send)
+            return
+
+        # Buffer the body so it can be fingerprinted and replayed to the app
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        body = b"".join(chunks)
+
+        request_hash = hashlib.sha256(
+            b"\n".join([scope["method"].encode(), scope["path"].encode(), scope.get("query_string", b""), body])
+        ).hexdigest()
+
+        record, claimed = await run_in_threadpool(_claim, owner, key, request_hash)
+
+        if not claimed:
+            if record is not None and record["requestHash"] != request_hash:
+                response = JSONResponse(
+                    {"detail": "Idempotency-Key was already used with a different request"},
+                    status_code=422
+                )
+            elif record is None or record["status"] != "completed":
+                response = JSONResponse(
+                    {"detail": "A request with this Idempotency-Key is still being processed"},
+                    status_code=409,
+                    headers={"Retry-After": "1"}
+                )
+            else:
+                response = Response(
+                    content=record["responseBody"] or b"",
+                    status_code=record["responseStatus"],
+                    media_type=record["responseContentType"],
+                    headers={"Idempotent-Replayed": "true"}
+                )
+            await response(scope, receive, send)
+            return
+
+        body_sent = False
+
+        async def replay_receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        captured = {"status": 500, "content_type": None, "body": []}
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                captured["status"] = message["status"]
+                captured["content_type"] = Headers(raw=message.get("headers", [])).get("content-type")
+            elif message["type"] == "http.response.body":
+                captured["body"].append(message.get("body", b""))
+            await send(message)
+
+        async def keep_claim():
+            while True:
+                await anyio.sleep(IDEMPOTENCY_LOCK_SECONDS / 3)
+                try:
+                    await run_in_threadpool(_refresh, record["id"])
+                except Exception as e:
+                    logger.warning("could not refresh idempotency key claim: %s", e)
+
+        try:
+            async with anyio.create_task_group() as task_group:
+                task_group.start_soon(keep_claim)
+                await self.app(scope, replay_receive, capture_send)
+                task_group.cancel_scope.cancel()
+        except BaseException:
+            with anyio.CancelScope(shield=True):
+                await run_in_threadpool(_release, record["id"])
+            raise
+
+        with anyio.CancelScope(shield=True):
+            if captured["status"] >= 500:
+                # Server errors are not cached so the client can retry them
+                await run_in_threadpool(_release, record["id"])
+            else:
+                await run_in_threadpool(
+                    _complete, record["id"], captured["status"], captured["content_type"], b"".join(captured["body"])
+                )
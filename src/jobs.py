@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+"""
+Background jobs on Postgres.
+
+Work that takes seconds (tenant provisioning, exports, bulk imports) is stored
+as a row in `jobs`, and the request returns 202 with the job id. Worker
+threads claim due jobs with FOR UPDATE SKIP LOCKED, so any number of workers
+across processes share the queue without double-running a job. A failed job
+is retried with exponential backoff until it has used maxAttempts. While a
+job runs, its worker refreshes lockedAt every JOB_HEARTBEAT_INTERVAL seconds.
+A job whose worker died (no heartbeat for JOB_LOCK_TIMEOUT) is claimed again;
+long exports and imports are not.
+Maintenance jobs are enqueued on a schedule, at most once per interval across
+all workers.
+
+By default each API process runs JOB_WORKERS worker threads. To run them
+out of process instead, set JOB_WORKERS=0 for the API and start:
+
+Usage:
+    python -m src.jobs worker [--threads N]
+    python -m src.jobs enqueue purge_idempotency_keys
+"""
+import argparse
+import contextvars
+import json
+import logging
+import os
+import random
+import socket
+import sys
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from .metrics import Counter
+from .unified_database import SessionLocal, Job, get_database
+from . import usage  # noqa: F401 - keeps tenant usage counters current for rows jobs create
+
+logger = logging.getLogger("sparkco.jobs")
+
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 1.0))
+JOB_LOCK_TIMEOUT = int(os.getenv("JOB_LOCK_TIMEOUT", 900))
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", 30))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 5))
+JOB_RETRY_BASE = float(os.getenv("JOB_RETRY_BASE", 5))
+JOB_RETRY_MAX = float(os.getenv("JOB_RETRY_MAX", 600))
+JOB_RETENTION_DAYS = int(os.getenv("JOB_RETENTION_DAYS", 7))
+# Relative to the repository, not the working directory, so the API and workers agree
+JOB_FILES_DIR = os.getenv(
+    "JOB_FILES_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "job_files")
+)
+
+# (kind, interval in seconds) enqueued by every worker's scheduler, deduplicated in the database
+PERIODIC_JOBS = [
+    ("purge_idempotency_keys", int(os.getenv("IDEMPOTENCY_PURGE_INTERVAL", 3600))),
+    ("purge_jobs", 3600),
+    ("reconcile_usage", int(os.getenv("USAGE_RECONCILE_INTERVAL", 86400))),
+    ("expire_subscriptions", int(os.getenv("SUBSCRIPTION_SWEEP_INTERVAL", 300))),
+]
+SCHEDULE_LOCK_ID = 72018
+
+jobs_finished = Counter("jobs_finished_total", "Jobs run to completion by outcome", ("kind", "status"))
+
+class PermanentJobError(Exception):
+    """The job can never succeed; fail it without retrying"""
+
+JOB_HANDLERS = {}
+
+def job_handler(kind: str):
+    """Register fn(payload, job_id, db) -> result dict as the handler for `kind`"""
+    def register(fn):
+        JOB_HANDLERS[kind] = fn
+        return fn
+    return register
+
+def job_file_path(job_id, suffix: str) -> str:
+    os.makedirs(JOB_FILES_DIR, exist_ok=True)
+    return os.path.join(JOB_FILES_DIR, f"{job_id}{suffix}")
+
+def enqueue_job(db: Session, kind: str, payload: dict, tenant_id: str = None, created_by_id: str = None,
+                job_id=None, max_attempts: int = None, run_at: datetime = None) -> Job:
+    """Add a queued job to the caller's transaction; a local worker is woken up once it commits"""
+    job = Job(
+        id=job_id or uuid.uuid4(),
+        kind=kind,
+        payload=payload,
+        tenantId=tenant_id,
+        createdById=created_by_id,
+        maxAttempts=max_attempts or JOB_MAX_ATTEMPTS,
+        runAt=run_at or datetime.utcnow(),
+    )
+    db.add(job)
+    db.flush()
+    event.listen(db, "after_commit", _wake_local_worker, once=True)
+    return job
+
+def _wake_local_worker(session):
+    worker = get_database().locals.get("job_worker")
+    if worker is not None:
+        worker.wake()
+
+def job_summary(job: Job) -> dict:
+    return {
+        "id": str(job.id),
+        "kind": job.kind,
+        "status": job.status,
+        "attempts": job.attempts,
+        "max_attempts": job.maxAttempts,
+        "result": job.result,
+        "error": job.error,
+        "created_at": job.createdAt,
+        "run_at": job.runAt,
+        "finished_at": job.finishedAt,
+    }
+
+def job_accepted(job: Job) -> dict:
+    """Body of a 202 response for a newly queued job"""
+    return {"job_id": str(job.id), "status": job.status, "status_url": f"/jobs/{job.id}"}
+
+CLAIM_SQL = text("""
+    UPDATE jobs SET status = 'running', attempts = attempts + 1, "lockedAt" = :now, "lockedBy" = :worker
+    WHERE id = (
+        SELECT id FROM jobs
+        WHERE (status = 'queued' AND "runAt" <= :now)
+           OR (status = 'running' AND "lockedAt" < :stale_before)
+        ORDER BY "runAt"
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, kind, payload, attempts, "maxAttempts"
+""")
+
+FINISH_SQL = text("""
+    UPDATE jobs SET status = :status, result = CAST(:result AS JSON), error = :error,
+                    "finishedAt" = :now, "lockedAt" = NULL, "lockedBy" = NULL
+    WHERE id = :id AND "lockedBy" = :worker
+""")
+
+HEARTBEAT_SQL = text("""
+    UPDATE jobs SET "lockedAt" = :now
+    WHERE id = :id AND status = 'running' AND "lockedBy" = :worker
+""")
+
+RETRY_SQL = text("""
+    UPDATE jobs SET status = 'queued', error = :error, "runAt" = :run_at, "lockedAt" = NULL, "lockedBy" = NULL
+    WHERE id = :id AND "lockedBy" = :worker
+""")
+
+def claim_job(worker_id: str):
+    """Lock the oldest due job for `worker_id`; returns its row or None"""
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        row = db.execute(CLAIM_SQL, {
+            "now": now, "worker": worker_id, "stale_before": now - timedelta(seconds=JOB_LOCK_TIMEOUT)
+        }).first()
+        db.commit()
+        return row
+    finally:
+        db.close()
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with jitter"""
+    return min(JOB_RETRY_MAX, JOB_RETRY_BASE * 2 ** (attempts - 1)) * random.uniform(0.5, 1.0)
+
+def _update_job(statement, params: dict) -> int:
+    db = SessionLocal()
+    try:
+        updated = db.execute(statement, params).rowcount
+        db.commit()
+        return updated
+    finally:
+        db.close()
+
+def _finish(job, worker_id: str, status: str, result=None, error: str = None):
+    updated = _update_job(FINISH_SQL, {
+        "id": job.id, "worker": worker_id, "status": status, "now": datetime.utcnow(),
+        "result": json.dumps(result, default=str) if result is not None else None, "error": error
+    })
+    if not updated:
+        logger.warning("job %s (%s) is no longer locked by %s; %s outcome discarded",
+                       job.id, job.kind, worker_id, status)
+        return
+    jobs_finished.inc(kind=job.kind, status=status)
+
+def _heartbeat(job, worker_id: str, stop: threading.Event):
+    """Refresh the job's lockedAt until `stop` is set, so a long run is never taken for a dead worker"""
+    while not stop.wait(JOB_HEARTBEAT_INTERVAL):
+        try:
+            if not _update_job(HEARTBEAT_SQL, {"id": job.id, "worker": worker_id, "now": datetime.utcnow()}):
+                logger.warning("job %s (%s) lost its lock", job.id, job.kind)
+                return
+        except Exception as e:
+            logger.warning("job %s heartbeat failed: %s", job.id, e)
+
+def run_job(job, worker_id: str):
+    """Run a claimed job and record success, a retry or the final failure"""
+    handler = JOB_HANDLERS.get(job.kind)
+    if handler is None:
+        _finish(job, worker_id, "failed", error=f"No handler for job kind '{job.kind}'")
+        return
+    if job.attempts > job.maxAttempts:
+        # Claimed again after its worker died on the last attempt
+        _finish(job, worker_id, "failed", error="Worker stopped while running the last attempt")
+        return
+
+    stop_heartbeat = threading.Event()
+    heartbeat = threading.Thread(
+        target=contextvars.copy_context().run, args=(_heartbeat, job, worker_id, stop_heartbeat),
+        name=f"{threading.current_thread().name}-heartbeat", daemon=True
+    )
+    heartbeat.start()
+    db = SessionLocal()
+    failure = None
+    try:
+        result = handler(job.payload or {}, job.id, db)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        failure = e
+    finally:
+        db.close()
+        stop_heartbeat.set()
+        heartbeat.join()
+
+    if failure is None:
+        _finish(job, worker_id, "succeeded", result=result)
+        return
+    error = f"{type(failure).__name__}: {failure}"
+    if isinstance(failure, PermanentJobError) or job.attempts >= job.maxAttempts:
+        logger.error("job %s (%s) failed: %s", job.id, job.kind, error, exc_info=failure)
+        _finish(job, worker_id, "failed", error=error)
+    else:
+        delay = retry_delay(job.attempts)
+        logger.warning("job %s (%s) attempt %d failed, retrying in %.0fs: %s",
+                       job.id, job.kind, job.attempts, delay, error)
+        _update_job(RETRY_SQL, {
+            "id": job.id, "worker": worker_id, "error": error,
+            "run_at": datetime.utcnow() + timedelta(seconds=delay)
+        })
+
+def schedule_periodic_jobs():
+    """Enqueue each PERIODIC_JOBS kind unless one was created within its interval"""
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        for kind, interval in PERIODIC_JOBS:
+            # Serializes schedulers of all workers; the check below runs on a fresh snapshot
+            db.execute(text("SELECT pg_advisory_xact_lock(:id, :kind)"), {
+                "id": SCHEDULE_LOCK_ID, "kind": zlib.crc32(kind.encode()) - 2 ** 31
+            })
+            recent = db.query(Job.id).filter(
+                Job.kind == kind, Job.createdAt > now - timedelta(seconds=interval)
+            ).first()
+            if recent is None:
+                db.add(Job(kind=kind, payload={}, maxAttempts=3, runAt=now, createdAt=now))
+            db.commit()
+    finally:
+        db.close()
+
+class JobWorker:
+    """Worker threads claiming and running jobs, plus the periodic scheduler"""
+
+    def __init__(self, threads: int, name: str = None):
+        self.threads = threads
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._threads = []
+
+    def start(self):
+        targets = [self._work] * self.threads + [self._schedule]
+        for index, target in enumerate(targets):
+            # Each thread runs in a copy of the caller's context (current Settings and Database)
+            context = contextvars.copy_context()
+            thread = threading.Thread(target=context.run, args=(target,), name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def wake(self):
+        self._wakeup.set()
+
+    def stop(self, timeout: float = 30):
+        """Stop claiming jobs and wait for running ones to finish"""
+        self._stop.set()
+        self._wakeup.set()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0, deadline - time.monotonic()))
+        self._threads = []
+
+    def _work(self):
+        worker_id = f"{self.name}:{threading.current_thread().name}"
+        while not self._stop.is_set():
+            try:
+                job = claim_job(worker_id)
+            except Exception as e:
+                logger.warning("could not claim a job: %s", e)
+                job = None
+            if job is None:
+                self._wakeup.wait(JOB_POLL_INTERVAL)
+                self._wakeup.clear()
+                continue
+            run_job(job, worker_id)
+
+    def _schedule(self):
+        while not self._stop.is_set():
+            try:
+                schedule_periodic_jobs()
+            except Exception as e:
+                logger.warning("could not schedule periodic jobs: %s", e)
+            self._stop.wait(60)
+
+def start_local_worker(threads: int) -> JobWorker:
+    """Start worker threads for the current app; kept on its Database so other apps keep theirs"""
+    worker = JobWorker(threads)
+    get_database().locals["job_worker"] = worker
+    worker.start()
+    return worker
+
+def stop_local_worker():
+    worker = get_database().drop_local("job_worker")
+    if worker is not None:
+        worker.stop()
+
+# Handlers
+
+@job_handler("purge_idempotency_keys")
+def purge_idempotency_keys_job(payload: dict, job_id, db: Session):
+    from .unified_database import purge_expired_idempotency_keys
+    return {"deleted": purge_expired_idempotency_keys(db)}
+
+@job_handler("reconcile_usage")
+def reconcile_usage_job(payload: dict, job_id, db: Session):
+    from .usage import reconcile_usage
+    return {"tenants": reconcile_usage(db, payload.get("tenant_id"))}
+
+@job_handler("expire_subscriptions")
+def expire_subscriptions_job(payload: dict, job_id, db: Session):
+    from .subscriptions import expire_due_subscriptions
+    return {"expired": expire_due_subscriptions(db)}
+
+@job_handler("purge_jobs")
+def purge_jobs_job(payload: dict, job_id, db: Session):
+    """Delete finished jobs past JOB_RETENTION_DAYS together with their files"""
+    cutoff = datetime.utcnow() - timedelta(days=JOB_RETENTION_DAYS)
+    expired = db.query(Job.id).filter(Job.finishedAt < cutoff).all()
+    for (expired_id,) in expired:
+        for suffix in (".csv", ".export"):
+            path = os.path.join(JOB_FILES_DIR, f"{expired_id}{suffix}")
+            if os.path.exists(path):
+                os.remove(path)
+    deleted = db.query(Job).filter(Job.finishedAt < cutoff).delete(synchronize_session=False)
+    db.commit()
+    return {"deleted": deleted}
+
+@job_handler("provision_tenant")
+def provision_tenant_job(payload: dict, job_id, db: Session):
+    """Create a new tenant's welcome project and tasks (once, even when retried)"""
+    from .unified_database import Project, Task
+
+    tenant_id, owner_id = payload["tenant_id"], payload["owner_id"]
+    project = db.query(Project).filter(
+        Project.tenant_id == tenant_id, Project.name == "Getting Started"
+    ).first()
+    if project is None:
+        project = Project(
+            tenant_id=tenant_id,
+            name="Getting Started",
+            description="A sample project to explore your new workspace",
+            status="in_progress",
+            priority="medium",
+            startDate=datetime.utcnow().date().isoformat(),
+            projectManagerId=owner_id,
+        )
+        db.add(project)
+        db.flush()
+        for title, description in [
+            ("Invite your team", "Add teammates from the Users page"),
+            ("Create your first project", "Projects group tasks, people and budgets"),
+            ("Import existing tasks", "Upload a CSV from the Import page"),
+        ]:
+            db.add(Task(tenant_id=tenant_id, projectId=project.id, title=title, description=description,
+                        createdById=owner_id, assignedToId=owner_id))
+        db.commit()
+    return {"project_id": str(project.id)}
+
+@job_handler("export")
+def export_job(payload: dict, job_id, db: Session):
+    """Write an export to JOB_FILES_DIR for download from /jobs/{id}/result"""
+    from .routes.export import iter_export_chunks, export_filename
+
+    job = db.get(Job, job_id)
+    path = job_file_path(job_id, ".export")
+    size = 0
+    with open(path, "wb") as f:
+        for chunk in iter_export_chunks(payload["resource"], str(job.tenantId), payload["format"], payload["gzip"]):
+            f.write(chunk)
+            size += len(chunk)
+    filename, media_type = export_filename(payload["resource"], payload["format"], payload["gzip"])
+    return {"filename": filename, "media_type": media_type, "bytes": size}
+
+@job_handler("import")
+def import_job(payload: dict, job_id, db: Session):
+    """Import the CSV uploaded with the job"""
+    import io
+    from .bulk_import import import_tasks_csv, import_users_csv
+
+    job = db.get(Job, job_id)
+    path = payload["path"]
+    if not os.path.exists(path):
+        raise PermanentJobError("Uploaded file is missing")
+    with open(path, "rb") as f:
+        stream = io.TextIOWrapper(f, encoding="utf-8", newline="")
+        try:
+            if payload["resource"] == "tasks":
+                report = import_tasks_csv(stream, str(job.tenantId), db, created_by_id=payload.get("created_by_id"))
+            else:
+                report = import_users_csv(stream, str(job.tenantId), db)
+        except UnicodeDecodeError:
+            raise PermanentJobError("CSV must be UTF-8 encoded")
+    os.remove(path)
+    return report.model_dump(mode="json")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run or enqueue background jobs")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    worker_parser = subparsers.add_parser("worker", help="Run job worker threads until interrupted")
+    worker_parser.add_argument("--threads", type=int, default=int(os.getenv("JOB_WORKER_THREADS", 4)))
+    enqueue_parser = subparsers.add_parser("enqueue", help="Queue a job with an empty payload")
+    enqueue_parser.add_argument("kind", choices=sorted(JOB_HANDLERS))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    if args.command == "enqueue":
+        db = SessionLocal()
+        try:
+            job = enqueue_job(db, args.kind, {})
+            db.commit()
+            print(f"✅ Queued {args.kind} job {job.id}")
+        finally:
+            db.close()
+        return
+
+    worker = JobWorker(args.threads)
+    worker.start()
+    print(f"🚀 Job worker {worker.name} running {args.threads} thread(s); Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("Stopping, waiting for running jobs...")
+        worker.stop()
+        sys.exit(0)
+
+if __name__ == "__main__":
+    main()
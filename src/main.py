@@ -1,37 +1,189 @@
-from fastapi import FastAPI
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import APIRouter, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 
-from .unified_database import create_tables
-from .routes import auth, users, projects, tasks, tenants, plans
-
-app = FastAPI(title="SparkCo ERP - Project Management API", version="1.0.0")
-
-# Ensure tables are created at startup
-@app.on_event("startup")
-def on_startup():
-    create_tables()
-
-# Include all routes
-app.include_router(auth.router)
-app.include_router(users.router)
-app.include_router(projects.router)
-app.include_router(tasks.router)
-app.include_router(tenants.router)
-app.include_router(plans.router)
-
-# Add CORS middleware for frontend integration
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Configure this properly for production
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+from .config import Settings, use_settings, reset_settings
+from .unified_database import Database, SessionLocal, check_schema_version, use_database, reset_database
+from .auth import shutdown_hash_executor
+from .idempotency import IdempotencyMiddleware
+from .db_instrumentation import RequestTimingMiddleware, install_query_instrumentation
+from .metrics import (
+    MetricsMiddleware, METRICS_MULTIPROC_DIR, register_pool, render_metrics,
+    flush_metrics, flush_metrics_periodically
+)
+from .admission import AdmissionControlMiddleware
+from .tenant_db_guard import (
+    TenantDbBusyError, StatementTimeoutError, install_tenant_db_guards
 )
+from .warmup import warm_up
+from .tenant_resolver import TenantHostMiddleware, tenant_domain_map
+from .profiling import ProfilingMiddleware
+from .tracing import TracingMiddleware, install_sql_tracing
+from .jobs import start_local_worker, stop_local_worker
+from .routes import auth, users, projects, tasks, tenants, plans, export, imports, profiles, health, jobs
 
-@app.get("/")
+root_router = APIRouter()
+
+@root_router.get("/")
 def read_root():
     return {"message": "SparkCo ERP - Project Management API", "status": "running"}
 
-@app.get("/health")
+@root_router.get("/health")
 def health_check():
-    return {"status": "healthy", "service": "SparkCo ERP API"}
\ No newline at end of file
+    return {"status": "healthy", "service": "SparkCo ERP API"}
+
+@root_router.get("/metrics", include_in_schema=False)
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+async def tenant_db_busy_handler(request, exc: TenantDbBusyError):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Too many concurrent database sessions for this tenant"},
+        headers={"Retry-After": "1"}
+    )
+
+async def statement_timeout_handler(request, exc: StatementTimeoutError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Query took too long and was cancelled; narrow the request and retry"}
+    )
+
+class AppContextMiddleware:
+    """Makes the app's Settings and Database current for everything the request runs"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        state = scope["app"].state if "app" in scope else None
+        database = getattr(state, "database", None)
+        if scope["type"] != "http" or database is None:
+            await self.app(scope, receive, send)
+            return
+        settings_token = use_settings(state.settings)
+        database_token = use_database(database)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            reset_database(database_token)
+            reset_settings(settings_token)
+
+def _start(app: FastAPI):
+    settings = app.state.settings
+    logging.basicConfig(level=settings.log_level)
+    # Schema changes are applied by `python -m src.migrate`; startup only verifies the version
+    check_schema_version()
+    engine = app.state.database.engine
+    install_query_instrumentation(engine)
+    install_sql_tracing(engine)
+    install_tenant_db_guards(engine)
+    register_pool(engine.pool)
+    db = SessionLocal()
+    try:
+        logging.getLogger("sparkco.tenants").info("tenant domain map: %d domains", tenant_domain_map.warm(db))
+    finally:
+        db.close()
+    if settings.warmup:
+        try:
+            warm_up(engine)
+        except Exception as e:
+            # /readyz retries the warmup and reports not ready until it succeeds
+            logging.getLogger("sparkco.warmup").warning("warmup failed: %s", e)
+
+def _stop(app: FastAPI):
+    stop_local_worker()
+    flush_metrics()
+    shutdown_hash_executor()
+    # Caches, the tenant domain map and the warm flag are this app's alone
+    app.state.database.clear_locals()
+    app.state.database.dispose()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Owns the engine/pool, caches and executors for one app instance"""
+    app.state.database = Database(app.state.settings)
+    settings_token = use_settings(app.state.settings)
+    database_token = use_database(app.state.database)
+    flusher = None
+    try:
+        _start(app)
+        if app.state.settings.job_workers > 0:
+            # Started here so the worker threads inherit this app's settings and database
+            start_local_worker(app.state.settings.job_workers)
+        if METRICS_MULTIPROC_DIR:
+            flusher = asyncio.get_running_loop().create_task(flush_metrics_periodically())
+        yield
+    finally:
+        if flusher:
+            flusher.cancel()
+        _stop(app)
+        reset_database(database_token)
+        reset_settings(settings_token)
+        app.state.database = None
+
+def create_app(settings: Optional[Settings] = None) -> FastAPI:
+    """Build an app for `settings` (default: from the environment); no I/O until startup"""
+    settings = settings or Settings.from_env()
+    app = FastAPI(title="SparkCo ERP - Project Management API", version="1.0.0", lifespan=lifespan)
+    app.state.settings = settings
+    app.state.database = None
+
+    # Include all routes
+    app.include_router(auth.router)
+    app.include_router(users.router)
+    app.include_router(projects.router)
+    app.include_router(tasks.router)
+    app.include_router(tenants.router)
+    app.include_router(plans.router)
+    app.include_router(export.router)
+    app.include_router(imports.router)
+    app.include_router(jobs.router)
+    app.include_router(profiles.router)
+    app.include_router(health.router)
+    app.include_router(root_router)
+
+    app.add_exception_handler(TenantDbBusyError, tenant_db_busy_handler)
+    app.add_exception_handler(StatementTimeoutError, statement_timeout_handler)
+
+    # Profile single requests sent with X-Profile: cpu|memory by a super_admin
+    app.add_middleware(ProfilingMiddleware)
+
+    # Replay stored responses for retried POSTs carrying an Idempotency-Key
+    app.add_middleware(IdempotencyMiddleware)
+
+    # Per-request DB timing (Server-Timing header, slow query log)
+    app.add_middleware(RequestTimingMiddleware)
+
+    # Shed low-priority work with 503 under DB pool pressure; per-request deadlines
+    app.add_middleware(AdmissionControlMiddleware)
+
+    # Request latency, in-flight and per-tenant metrics for /metrics
+    app.add_middleware(MetricsMiddleware)
+
+    # Sampled request traces with spans for dependencies, SQL and serialization
+    app.add_middleware(TracingMiddleware)
+
+    # Fill in X-Tenant-ID from the Host header (tenant subdomains and custom domains)
+    app.add_middleware(TenantHostMiddleware)
+
+    # Add CORS middleware for frontend integration
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=settings.cors_origins,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    # Outermost, so every middleware above sees this app's settings and database
+    app.add_middleware(AppContextMiddleware)
+    return app
+
+# Module-level app for `uvicorn src.main:app`
+app = create_app()
@@ -0,0 +1,345 @@
+"""
+Prometheus-style metrics in the text exposition format.
+
+Metric families:
+- http_request_duration_seconds  histogram per route template, method and status
+- http_requests_in_flight        gauge
+- tenant_requests_total          counter per tenant (bounded to MAX_TENANT_LABELS tenants)
+- db_pool_checkout_wait_seconds  histogram of time spent waiting for a pool connection
+- db_pool_connections            gauge per pool state, db_pool_utilization ratio
+- cache_requests_total           counter per cache and result (hit/miss)
+- http_requests_shed_total       counter per priority of requests rejected by admission control
+- http_request_deadline_total    counter of requests cancelled (deadline / client disconnect)
+
+Values live in plain per-worker dicts and are updated without locks; on the hot
+path that is one dict lookup and an add. An increment racing between two
+threadpool threads can occasionally be lost, which is acceptable for
+monitoring. When several workers run, set METRICS_MULTIPROC_DIR: each worker
+periodically writes a snapshot file there and /metrics merges all snapshots.
+Counters and histograms are summed. Gauges are not: each live worker's value
+is reported with a `pid` label, and ratio gauges (db_pool_utilization) report
+the highest worker's value, since a sum of ratios means nothing.
+"""
+import asyncio
+import bisect
+import json
+import os
+import tempfile
+import time
+
+from sqlalchemy.pool import QueuePool
+
+from .tracing import end_span, start_span
+
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR")
+MAX_TENANT_LABELS = int(os.getenv("METRICS_MAX_TENANT_LABELS", 100))
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+REGISTRY = []
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _label_key(labelnames, labels: dict) -> str:
+    return ",".join(f'{name}="{_escape(labels.get(name, ""))}"' for name in labelnames)
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class Metric:
+    type = None
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        REGISTRY.append(self)
+
+    def snapshot(self) -> dict:
+        return dict(self.values)
+
+    def render(self, values: dict):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{{{key}}} {_format_value(value)}" if key else f"{self.name} {_format_value(value)}")
+        return lines
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(self.labelnames, labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames=(), collect=None, multiprocess_mode: str = "all"):
+        super().__init__(name, help, labelnames)
+        # Optional callback yielding (labels dict, value) pairs at scrape time
+        self.collect = collect
+        # Merging across workers: "all" = one series per worker (pid label), "max" = highest value
+        self.multiprocess_mode = multiprocess_mode
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(self.labelnames, labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        self.values[_label_key(self.labelnames, labels)] = value
+
+    def snapshot(self) -> dict:
+        if self.collect:
+            for labels, value in self.collect():
+                self.set(value, **labels)
+        return dict(self.values)
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        series = self.values.get(key)
+        if series is None:
+            # Per-bucket (non-cumulative) counts, +Inf bucket, sum, count
+            series = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def snapshot(self) -> dict:
+        return {key: list(series) for key, series in self.values.items()}
+
+    def render(self, values: dict):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for key, series in sorted(values.items()):
+            prefix = f"{key}," if key else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                lines.append(f'{self.name}_bucket{{{prefix}le="{le}"}} {cumulative}')
+            suffix = f"{{{key}}}" if key else ""
+            lines.append(f"{self.name}_sum{suffix} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{suffix} {series[-1]}")
+        return lines
+
+# Metric families
+request_duration = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ("method", "route", "status")
+)
+requests_in_flight = Gauge("http_requests_in_flight", "HTTP requests currently being served")
+tenant_requests = Counter("tenant_requests_total", "HTTP requests per tenant", ("tenant",))
+pool_checkout_wait = Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a database pool connection",
+    buckets=POOL_WAIT_BUCKETS
+)
+cache_requests = Counter("cache_requests_total", "Cache lookups by cache and result", ("cache", "result"))
+requests_shed = Counter("http_requests_shed_total", "Requests rejected by admission control", ("priority",))
+request_deadlines = Counter(
+    "http_request_deadline_total", "Requests cut short by their deadline or a client disconnect", ("reason",)
+)
+
+_pools = []
+
+def _collect_pool_connections():
+    for pool in _pools:
+        checked_out = pool.checkedout()
+        yield {"state": "checked_out"}, checked_out
+        yield {"state": "idle"}, pool.checkedin()
+        yield {"state": "overflow"}, max(pool.overflow(), 0)
+
+def _collect_pool_utilization():
+    for pool in _pools:
+        capacity = pool.size() + max(pool._max_overflow, 0)
+        yield {}, pool.checkedout() / capacity if capacity else 0.0
+
+pool_connections = Gauge(
+    "db_pool_connections", "Database pool connections by state", ("state",),
+    collect=_collect_pool_connections
+)
+pool_utilization = Gauge(
+    "db_pool_utilization", "Checked-out connections as a fraction of pool capacity",
+    collect=_collect_pool_utilization, multiprocess_mode="max"
+)
+
+class DecayingAverage:
+    """Exponentially weighted average that also decays toward 0 while no samples arrive"""
+
+    def __init__(self, half_life: float):
+        self.half_life = half_life
+        self._value = 0.0
+        self._updated = time.monotonic()
+
+    def _decayed(self, now: float) -> float:
+        return self._value * 0.5 ** ((now - self._updated) / self.half_life)
+
+    def add(self, sample: float, weight: float = 0.2):
+        now = time.monotonic()
+        self._value = self._decayed(now) * (1 - weight) + sample * weight
+        self._updated = now
+
+    @property
+    def value(self) -> float:
+        return self._decayed(time.monotonic())
+
+# Recent pool checkout wait in seconds, read by admission control
+pool_wait_average = DecayingAverage(half_life=5.0)
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        span, token = start_span("db.pool_checkout")
+        try:
+            return super()._do_get()
+        finally:
+            end_span(span, token)
+            waited = time.perf_counter() - started
+            pool_checkout_wait.observe(waited)
+            pool_wait_average.add(waited)
+
+def register_pool(pool):
+    if isinstance(pool, QueuePool) and pool not in _pools:
+        _pools.append(pool)
+
+# Cache counters (used by the in-process caches)
+def record_cache_hit(cache: str):
+    cache_requests.inc(cache=cache, result="hit")
+
+def record_cache_miss(cache: str):
+    cache_requests.inc(cache=cache, result="miss")
+
+_tenant_labels = set()
+
+def tenant_label(tenant_id) -> str:
+    """Bound label cardinality: the first MAX_TENANT_LABELS tenants seen get their own series"""
+    if not tenant_id:
+        return "none"
+    if tenant_id in _tenant_labels:
+        return tenant_id
+    if len(_tenant_labels) < MAX_TENANT_LABELS:
+        _tenant_labels.add(tenant_id)
+        return tenant_id
+    return "other"
+
+# Multiprocess aggregation
+def _snapshot() -> dict:
+    return {"pid": os.getpid(), "metrics": {metric.name: metric.snapshot() for metric in REGISTRY}}
+
+def flush_metrics():
+    """Write this worker's snapshot to METRICS_MULTIPROC_DIR (atomic replace)"""
+    if not METRICS_MULTIPROC_DIR:
+        return
+    os.makedirs(METRICS_MULTIPROC_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=METRICS_MULTIPROC_DIR, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(_snapshot(), f)
+    os.replace(tmp_path, os.path.join(METRICS_MULTIPROC_DIR, f"{os.getpid()}.json"))
+
+async def flush_metrics_periodically(interval: float = 5.0):
+    """Background task keeping this worker's snapshot fresh for the other workers"""
+    while True:
+        await asyncio.sleep(interval)
+        flush_metrics()
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _load_snapshots():
+    snapshots = [_snapshot()]
+    if not METRICS_MULTIPROC_DIR or not os.path.isdir(METRICS_MULTIPROC_DIR):
+        return snapshots
+    for filename in os.listdir(METRICS_MULTIPROC_DIR):
+        if not filename.endswith(".json") or filename == f"{os.getpid()}.json":
+            continue
+        try:
+            with open(os.path.join(METRICS_MULTIPROC_DIR, filename)) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+def _with_pid(key: str, pid: int) -> str:
+    return f'{key},pid="{pid}"' if key else f'pid="{pid}"'
+
+def render_metrics() -> str:
+    """Render all metric families, merged across workers when running multiprocess"""
+    snapshots = _load_snapshots()
+    lines = []
+    for metric in REGISTRY:
+        merged = {}
+        for snapshot in snapshots:
+            # Gauges of workers that have exited are stale; counters and histograms keep counting
+            if metric.type == "gauge" and snapshot["pid"] != os.getpid() and not _pid_alive(snapshot["pid"]):
+                continue
+            for key, value in snapshot["metrics"].get(metric.name, {}).items():
+                if metric.type == "histogram":
+                    current = merged.setdefault(key, [0] * len(value))
+                    for i, item in enumerate(value):
+                        current[i] += item
+                elif metric.type == "counter":
+                    merged[key] = merged.get(key, 0) + value
+                elif not METRICS_MULTIPROC_DIR:
+                    merged[key] = value
+                elif metric.multiprocess_mode == "max":
+                    merged[key] = max(merged.get(key, value), value)
+                else:
+                    merged[_with_pid(key, snapshot["pid"])] = value
+        lines.extend(metric.render(merged))
+    return "\n".join(lines) + "\n"
+
+class MetricsMiddleware:
+    """Records latency per route template, in-flight requests and per-tenant counts"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            requests_in_flight.dec()
+            route = scope.get("route")
+            request_duration.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=status_code
+            )
+            # Set by get_tenant_context after the membership check; an unverified
+            # X-Tenant-ID must not take one of the MAX_TENANT_LABELS slots
+            tenant_id = scope.get("state", {}).get("tenant_id")
+            tenant_requests.inc(tenant=tenant_label(tenant_id))
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Schema migrations.
+
+Applies every migration newer than the version recorded in `schema_version`,
+each in its own transaction, under an advisory lock so concurrent runs (e.g.
+several deploy jobs) apply each step once. The API only checks the version at
+startup and never runs DDL itself, so run this before starting new code.
+
+Usage:
+    python -m src.migrate            # upgrade to the latest version
+    python -m src.migrate --check    # print current/required version, exit 1 if behind
+"""
+import argparse
+import sys
+
+from sqlalchemy import text
+
+from .unified_database import Base, SchemaVersion, SCHEMA_VERSION, get_engine, get_schema_version
+
+# Arbitrary constant identifying the migration lock
+MIGRATION_LOCK_ID = 72017
+
+def _initial_schema(connection):
+    # Tables that already exist are left alone (databases created before versioning)
+    Base.metadata.create_all(bind=connection)
+
+def _row_versions(connection):
+    connection.execute(text("ALTER TABLE projects ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1"))
+    connection.execute(text("ALTER TABLE tasks ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1"))
+
+def _rate_limit_buckets(connection):
+    # UNLOGGED: token buckets are hot, tiny and worthless after a crash, so skip the WAL
+    connection.execute(text("""
+        CREATE UNLOGGED TABLE IF NOT EXISTS rate_limit_buckets (
+            key TEXT PRIMARY KEY,
+            tokens DOUBLE PRECISION NOT NULL,
+            allowed BOOLEAN NOT NULL,
+            updated_at TIMESTAMPTZ NOT NULL
+        )
+    """))
+
+def _tenant_usage(connection):
+    from .usage import RECONCILE_SQL
+    from .unified_database import TenantUsage
+    TenantUsage.__table__.create(bind=connection, checkfirst=True)
+    connection.execute(text(RECONCILE_SQL.format(where="")))
+
+def _jobs(connection):
+    from .unified_database import Job
+    Job.__table__.create(bind=connection, checkfirst=True)
+
+def _subscription_expiry_index(connection):
+    connection.execute(text(
+        'CREATE INDEX IF NOT EXISTS "ix_subscriptions_status_endDate" ON subscriptions (status, "endDate")'
+    ))
+
+def _idempotency_claim_refresh(connection):
+    connection.execute(text('ALTER TABLE idempotency_keys ADD COLUMN IF NOT EXISTS "lockedAt" TIMESTAMP'))
+
+# (version, description, apply(connection)) in order; append new steps and bump SCHEMA_VERSION
+MIGRATIONS = [
+    (1, "Initial schema", _initial_schema),
+    (2, "Row versions for optimistic concurrency", _row_versions),
+    (3, "Shared rate limit token buckets", _rate_limit_buckets),
+    (4, "Per-tenant usage counters", _tenant_usage),
+    (5, "Background jobs", _jobs),
+    (6, "Index for subscription expiry", _subscription_expiry_index),
+    (7, "Refreshable idempotency key claims", _idempotency_claim_refresh),
+]
+
+assert MIGRATIONS[-1][0] == SCHEMA_VERSION, "SCHEMA_VERSION must match the last migration"
+
+def migrate(engine=None) -> int:
+    """Apply pending migrations; returns the number of steps applied"""
+    engine = engine or get_engine()
+    applied = 0
+    # Session-level lock, so everything below must stay on this one connection
+    with engine.connect() as connection:
+        connection.execute(text("SELECT pg_advisory_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+        connection.commit()
+        try:
+            SchemaVersion.__table__.create(bind=connection, checkfirst=True)
+            connection.commit()
+            current = get_schema_version(connection) or 0
+            for version, description, apply in MIGRATIONS:
+                if version <= current:
+                    continue
+                print(f"Applying migration {version}: {description}")
+                apply(connection)
+                connection.execute(SchemaVersion.__table__.insert().values(version=version, description=description))
+                connection.commit()
+                applied += 1
+        finally:
+            connection.rollback()
+            connection.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATION_LOCK_ID})
+            connection.commit()
+    return applied
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply database schema migrations")
+    parser.add_argument("--check", action="store_true", help="Only report the current and required version")
+    args = parser.parse_args()
+
+    try:
+        if args.check:
+            with get_engine().connect() as connection:
+                current = get_schema_version(connection)
+            print(f"Database schema version: {current}, required: {SCHEMA_VERSION}")
+            sys.exit(0 if current == SCHEMA_VERSION else 1)
+
+        applied = migrate()
+        print(f"✅ Schema is at version {SCHEMA_VERSION} ({applied} migration(s) applied)")
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        print("Make sure your DATABASE_URL is correctly set in the .env file")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+On-demand request profiling for administrators.
+
+A request carrying `X-Profile: cpu` or `X-Profile: memory` from a super_admin
+user is profiled and the result stored under PROFILE_DIR; the response gets an
+`X-Profile-Id` header and the profile can be fetched from GET /profiles/{id}.
+
+- cpu: a sampling profiler thread records the stacks of all threads every
+  PROFILE_INTERVAL_MS and writes them in collapsed-stack format (one
+  `frame;frame;frame count` line per stack), which flamegraph.pl and speedscope
+  render directly. Sampling is process wide, so concurrent requests on the same
+  worker show up too.
+- memory: tracemalloc snapshots taken before and after the request, diffed by
+  source line.
+
+Requests without the header only pay for one header scan. One profile runs at
+a time per worker; other profiled requests run unprofiled while it is busy.
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+
+from .auth import verify_token
+from .unified_database import SessionLocal, get_user_by_email
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "sparkco-profiles"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 2))
+PROFILE_MODES = {"cpu": "collapsed", "memory": "txt"}
+
+_profile_lock = threading.Lock()
+
+class SamplingProfiler:
+    """Samples every thread's stack from a background thread"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                key = ";".join(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+def profile_path(profile_id: str):
+    """Path of a stored profile, or None for unknown / malformed ids"""
+    try:
+        uuid.UUID(profile_id)
+    except ValueError:
+        return None
+    for extension in PROFILE_MODES.values():
+        path = os.path.join(PROFILE_DIR, f"{profile_id}.{extension}")
+        if os.path.exists(path):
+            return path
+    return None
+
+def _is_super_admin(authorization: str) -> bool:
+    if not authorization.lower().startswith("bearer "):
+        return False
+    try:
+        payload = verify_token(authorization[7:], "access")
+    except HTTPException:
+        return False
+    if not payload.get("sub"):
+        return False
+    db = SessionLocal()
+    try:
+        user = get_user_by_email(payload["sub"], db)
+        return user is not None and user.userRole == "super_admin"
+    finally:
+        db.close()
+
+def _write_profile(profile_id: str, extension: str, content: str):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(os.path.join(PROFILE_DIR, f"{profile_id}.{extension}"), "w") as f:
+        f.write(content)
+
+class ProfilingMiddleware:
+    """Profiles single requests that ask for it with the X-Profile header (super_admin only)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        mode = None
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                mode = value.decode("latin-1").strip().lower()
+                break
+        if mode not in PROFILE_MODES:
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        if not await run_in_threadpool(_is_super_admin, headers.get("authorization", "")):
+            await self.app(scope, receive, send)
+            return
+        if not _profile_lock.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = str(uuid.uuid4())
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("X-Profile-Id", profile_id)
+            await send(message)
+
+        try:
+            if mode == "cpu":
+                await self._profile_cpu(scope, receive, send_with_profile_id, profile_id)
+            else:
+                await self._profile_memory(scope, receive, send_with_profile_id, profile_id)
+        finally:
+            _profile_lock.release()
+
+    async def _profile_cpu(self, scope, receive, send, profile_id: str):
+        profiler = SamplingProfiler(PROFILE_INTERVAL_MS / 1000)
+        started = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiler.stop()
+            header = f"# {scope['method']} {scope['path']} {(time.perf_counter() - started) * 1000:.1f}ms\n"
+            _write_profile(profile_id, PROFILE_MODES["cpu"], header + profiler.collapsed())
+
+    async def _profile_memory(self, scope, receive, send, profile_id: str):
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start(25)
+        before = tracemalloc.take_snapshot()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            after = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            if not was_tracing:
+                tracemalloc.stop()
+            lines = [
+                f"# {scope['method']} {scope['path']} traced={current / 1024:.1f}KiB peak={peak / 1024:.1f}KiB",
+                "# Top allocations by source line (size diff, count diff):",
+            ]
+            lines.extend(str(stat) for stat in after.compare_to(before, "lineno")[:50])
+            _write_profile(profile_id, PROFILE_MODES["memory"], "\n".join(lines) + "\n")
@@ -0,0 +1,141 @@
+"""
+Per-tenant rate limiting and fair scheduling.
+
+Each tenant gets a token bucket sized by its plan (PLAN_LIMITS): `rate`
+requests per second refill the bucket up to `burst`. Requests beyond that get
+429 with Retry-After. Buckets live in one of two backends, set with
+RATE_LIMIT_BACKEND:
+
+- memory   (default) per-worker dict, fine for a single process
+- postgres shared UNLOGGED table updated by one UPSERT per request, so limits
+           hold across workers and hosts (gunicorn.conf.py selects it). The
+           UPSERT runs on the request's own session and is committed at once,
+           so a request still uses one pool connection and the bucket row is
+           locked only for that statement.
+
+With RATE_LIMIT_FAIR_QUEUING enabled, each worker also caps a tenant's
+concurrent requests (`concurrency`). A request over the cap waits up to
+RATE_LIMIT_QUEUE_TIMEOUT seconds for a slot, then gets 429. One tenant can
+then hold at most a bounded share of the worker's threads.
+"""
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from fastapi import HTTPException, status
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .metrics import Counter, tenant_label
+from .unified_database import request_resource
+
+PLAN_LIMITS = {
+    "starter": {"rate": 5.0, "burst": 20, "concurrency": 4},
+    "professional": {"rate": 20.0, "burst": 60, "concurrency": 10},
+    "enterprise": {"rate": 100.0, "burst": 300, "concurrency": 30},
+}
+DEFAULT_PLAN = "starter"
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() not in ("0", "false", "no")
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_FAIR_QUEUING = os.getenv("RATE_LIMIT_FAIR_QUEUING", "false").lower() in ("1", "true", "yes")
+RATE_LIMIT_QUEUE_TIMEOUT = float(os.getenv("RATE_LIMIT_QUEUE_TIMEOUT", 0.25))
+
+tenant_throttled = Counter(
+    "tenant_requests_throttled_total", "Requests rejected by per-tenant limits", ("tenant", "reason")
+)
+
+def plan_limits(plan_type) -> dict:
+    return PLAN_LIMITS.get(plan_type or DEFAULT_PLAN, PLAN_LIMITS[DEFAULT_PLAN])
+
+class MemoryBuckets:
+    """Token buckets in a per-worker dict"""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: float, db: Session = None):
+        """Take one token; returns (allowed, seconds until a token is available)"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+class PostgresBuckets:
+    """Token buckets in the rate_limit_buckets table, one UPSERT per request"""
+
+    TAKE_SQL = text("""
+        INSERT INTO rate_limit_buckets AS b (key, tokens, allowed, updated_at)
+        VALUES (:key, :burst - 1, true, clock_timestamp())
+        ON CONFLICT (key) DO UPDATE SET
+            allowed = LEAST(:burst, b.tokens + EXTRACT(EPOCH FROM clock_timestamp() - b.updated_at) * :rate) >= 1,
+            tokens = LEAST(:burst, b.tokens + EXTRACT(EPOCH FROM clock_timestamp() - b.updated_at) * :rate)
+                     - CASE WHEN LEAST(:burst, b.tokens + EXTRACT(EPOCH FROM clock_timestamp() - b.updated_at) * :rate) >= 1
+                            THEN 1 ELSE 0 END,
+            updated_at = clock_timestamp()
+        RETURNING allowed, tokens
+    """)
+
+    def take(self, key: str, rate: float, burst: float, db: Session):
+        allowed, tokens = db.execute(self.TAKE_SQL, {"key": key, "rate": rate, "burst": burst}).one()
+        # Commit now: the row lock must not live as long as the request's transaction.
+        # Objects the request already loaded (user, tenant) stay usable without a reload.
+        expire_on_commit, db.expire_on_commit = db.expire_on_commit, False
+        try:
+            db.commit()
+        finally:
+            db.expire_on_commit = expire_on_commit
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+_buckets = PostgresBuckets() if RATE_LIMIT_BACKEND == "postgres" else MemoryBuckets()
+
+def check_tenant_rate_limit(tenant_id: str, plan_type, db: Session):
+    """Raise 429 when the tenant has used up its plan's request rate"""
+    if not RATE_LIMIT_ENABLED:
+        return
+    limits = plan_limits(plan_type)
+    allowed, retry_after = _buckets.take(f"tenant:{tenant_id}", limits["rate"], limits["burst"], db)
+    if not allowed:
+        tenant_throttled.inc(tenant=tenant_label(tenant_id), reason="rate")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Tenant request rate limit exceeded",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+
+_slots = {}
+_slots_lock = threading.Lock()
+
+def _tenant_semaphore(tenant_id: str, limit: int) -> threading.BoundedSemaphore:
+    key = (tenant_id, limit)
+    semaphore = _slots.get(key)
+    if semaphore is None:
+        with _slots_lock:
+            semaphore = _slots.setdefault(key, threading.BoundedSemaphore(limit))
+    return semaphore
+
+@contextmanager
+def tenant_slot(tenant_id: str, plan_type):
+    """Hold one of the tenant's concurrent request slots (fair queuing mode only)"""
+    if not (RATE_LIMIT_ENABLED and RATE_LIMIT_FAIR_QUEUING):
+        yield
+        return
+    semaphore = _tenant_semaphore(tenant_id, plan_limits(plan_type)["concurrency"])
+    if not semaphore.acquire(timeout=RATE_LIMIT_QUEUE_TIMEOUT):
+        tenant_throttled.inc(tenant=tenant_label(tenant_id), reason="concurrency")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many concurrent requests for this tenant",
+            headers={"Retry-After": "1"}
+        )
+    # Released by the middleware too, should a deadline cancel the request before teardown
+    with request_resource(semaphore.release):
+        yield
@@ -4,10 +4,7 @@ from datetime import timedelta
 
 from ..unified_models import LoginCredentials, AuthResponse, User, UserCreate
 from ..unified_database import get_db, get_user_by_email, get_user_by_username, create_user
-from ..auth import (
-    verify_password, get_password_hash, create_access_token, 
-    ACCESS_TOKEN_EXPIRE_MINUTES
-)
+from ..auth import verify_password, get_password_hash, create_access_token
 from ..dependencies import get_current_user
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
@@ -28,11 +25,8 @@ async def login(credentials: LoginCredentials, db: Session = Depends(get_db)):
             detail="Account is inactive"
         )
     
-    # Create access token
-    access_token = create_access_token(
-        data={"sub": user.email},
-        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    )
+    # Create access token (expiry from settings.access_token_expire_minutes)
+    access_token = create_access_token(data={"sub": user.email})
     
     return AuthResponse(
         success=True,
@@ -0,0 +1,157 @@
+from fastapi import APIRouter, HTTPException, Depends, Path, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from typing import Optional
+from datetime import datetime
+import csv
+import io
+import json
+import uuid
+import zlib
+
+from ..unified_database import SessionLocal, get_db, iter_task_export_rows, iter_project_export_rows
+from ..dependencies import get_current_user, get_tenant_context
+from ..jobs import enqueue_job, job_accepted
+
+router = APIRouter(prefix="/export", tags=["export"])
+
+TASK_EXPORT_FIELDS = [
+    "id", "title", "description", "status", "priority", "projectId", "projectName",
+    "assignedToEmail", "createdByEmail", "dueDate", "estimatedHours", "actualHours",
+    "tags", "completedAt", "version", "createdAt", "updatedAt"
+]
+
+PROJECT_EXPORT_FIELDS = [
+    "id", "name", "description", "status", "priority", "startDate", "endDate",
+    "completionPercent", "budget", "actualCost", "projectManagerEmail", "notes",
+    "version", "createdAt", "updatedAt"
+]
+
+# Rows are buffered into chunks of roughly this size before being sent
+CHUNK_SIZE = 64 * 1024
+BATCH_SIZE = 1000
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+def _export_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+def _iter_rows(fetch_rows, tenant_id: str):
+    """Run the export query on its own session; the request session is closed before streaming starts"""
+    db = SessionLocal()
+    try:
+        for row in fetch_rows(db, tenant_id, batch_size=BATCH_SIZE):
+            yield row
+    finally:
+        db.close()
+
+def _iter_ndjson(rows, fields):
+    for row in rows:
+        yield json.dumps({field: _export_value(row[field]) for field in fields}) + "\n"
+
+def _iter_csv(rows, fields):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for row in rows:
+        writer.writerow(["" if row[field] is None else _export_value(row[field]) for field in fields])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+
+def _iter_chunks(lines, compress: bool):
+    """Group serialized rows into CHUNK_SIZE byte chunks, gzip-compressing on the fly if requested"""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS) if compress else None
+    pending = []
+    pending_size = 0
+    for line in lines:
+        data = line.encode("utf-8")
+        pending.append(data)
+        pending_size += len(data)
+        if pending_size >= CHUNK_SIZE:
+            chunk = b"".join(pending)
+            pending = []
+            pending_size = 0
+            if compressor:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                yield chunk
+    chunk = b"".join(pending)
+    if compressor:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
+
+EXPORTS = {
+    "tasks": (iter_task_export_rows, TASK_EXPORT_FIELDS),
+    "projects": (iter_project_export_rows, PROJECT_EXPORT_FIELDS),
+}
+
+def iter_export_chunks(resource: str, tenant_id: str, format: str, gzip: bool):
+    """Serialized export of a tenant's `resource` as byte chunks (used by streams and export jobs)"""
+    fetch_rows, fields = EXPORTS[resource]
+    rows = _iter_rows(fetch_rows, tenant_id)
+    lines = _iter_ndjson(rows, fields) if format == "ndjson" else _iter_csv(rows, fields)
+    return _iter_chunks(lines, gzip)
+
+def export_filename(resource: str, format: str, gzip: bool):
+    """(filename, media type) of an export"""
+    if gzip:
+        return f"{resource}.{format}.gz", "application/gzip"
+    return f"{resource}.{format}", MEDIA_TYPES[format]
+
+def _export_response(resource: str, tenant_context: Optional[dict], format: str, gzip: bool):
+    if not tenant_context:
+        raise HTTPException(status_code=400, detail="X-Tenant-ID header is required for exports")
+
+    filename, media_type = export_filename(resource, format, gzip)
+    return StreamingResponse(
+        iter_export_chunks(resource, tenant_context["tenant_id"], format, gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.get("/tasks")
+async def export_tasks(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = Query(False),
+    tenant_context: Optional[dict] = Depends(get_tenant_context)
+):
+    """Stream all tasks of the tenant as NDJSON or CSV (optionally gzipped)"""
+    return _export_response("tasks", tenant_context, format, gzip)
+
+@router.get("/projects")
+async def export_projects(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = Query(False),
+    tenant_context: Optional[dict] = Depends(get_tenant_context)
+):
+    """Stream all projects of the tenant as NDJSON or CSV (optionally gzipped)"""
+    return _export_response("projects", tenant_context, format, gzip)
+
+@router.post("/{resource}/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def create_export_job(
+    resource: str = Path(..., pattern="^(tasks|projects)$"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = Query(False),
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    tenant_context: Optional[dict] = Depends(get_tenant_context)
+):
+    """Export in the background; download the file from /jobs/{job_id}/result when the job succeeds"""
+    if not tenant_context:
+        raise HTTPException(status_code=400, detail="X-Tenant-ID header is required for exports")
+    
+    job = enqueue_job(
+        db, "export", {"resource": resource, "format": format, "gzip": gzip},
+        tenant_id=tenant_context["tenant_id"], created_by_id=str(current_user.id)
+    )
+    db.commit()
+    return job_accepted(job)
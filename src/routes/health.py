@@ -0,0 +1,59 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+import logging
+import os
+import time
+
+from ..unified_database import get_engine
+from ..warmup import is_warm, warm_up
+
+router = APIRouter(tags=["health"])
+
+logger = logging.getLogger("sparkco.health")
+
+READINESS_DB_LATENCY_MS = float(os.getenv("READINESS_DB_LATENCY_MS", 250))
+READINESS_MIN_POOL_HEADROOM = int(os.getenv("READINESS_MIN_POOL_HEADROOM", 1))
+
+def _check_pool() -> dict:
+    pool = get_engine().pool
+    capacity = pool.size() + max(pool._max_overflow, 0)
+    headroom = capacity - pool.checkedout()
+    return {"ok": headroom >= READINESS_MIN_POOL_HEADROOM, "headroom": headroom, "capacity": capacity}
+
+def _check_database() -> dict:
+    started = time.perf_counter()
+    try:
+        with get_engine().connect() as connection:
+            connection.execute(text("SELECT 1"))
+    except Exception as e:
+        return {"ok": False, "error": str(e).splitlines()[0]}
+    latency_ms = (time.perf_counter() - started) * 1000
+    return {"ok": latency_ms <= READINESS_DB_LATENCY_MS, "latency_ms": round(latency_ms, 1)}
+
+def _check_warm() -> dict:
+    if not is_warm():
+        # Warmup failed or was skipped at startup (e.g. DB down); retry it here
+        try:
+            warm_up(get_engine())
+        except Exception as e:
+            logger.warning("warmup failed: %s", e)
+    return {"ok": is_warm()}
+
+@router.get("/livez")
+def liveness():
+    """The process is up and serving requests (no dependency checks)"""
+    return {"status": "alive"}
+
+@router.get("/readyz")
+def readiness():
+    """Ready for traffic: database reachable and fast, pool has headroom, caches warm"""
+    checks = {"pool": _check_pool()}
+    # Skip the DB probe when the pool is exhausted; it would only queue behind other requests
+    checks["database"] = _check_database() if checks["pool"]["ok"] else {"ok": False, "skipped": True}
+    checks["warm"] = _check_warm() if checks["database"]["ok"] else {"ok": is_warm()}
+    ready = all(check["ok"] for check in checks.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not_ready", "checks": checks}
+    )
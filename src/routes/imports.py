@@ -0,0 +1,99 @@
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Request
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from typing import Optional
+import io
+import tempfile
+import uuid
+
+from ..unified_models import ImportReport
+from ..unified_database import SessionLocal
+from ..bulk_import import import_tasks_csv, import_users_csv
+from ..dependencies import get_current_user, get_tenant_context
+from ..jobs import enqueue_job, job_accepted, job_file_path
+
+router = APIRouter(prefix="/import", tags=["import"])
+
+# Uploads larger than this are spooled to disk instead of memory
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+def _check_import_access(current_user, tenant_context: Optional[dict]) -> str:
+    if current_user.userRole != "super_admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only administrators can import data"
+        )
+    if not tenant_context:
+        raise HTTPException(status_code=400, detail="X-Tenant-ID header is required for imports")
+    return tenant_context["tenant_id"]
+
+async def _spool_body(request: Request):
+    """Copy the raw CSV request body to a spooled temp file without buffering it all in memory"""
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    async for chunk in request.stream():
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+async def _enqueue_import(request: Request, resource: str, tenant_id: str, current_user) -> JSONResponse:
+    """Save the upload for a background import job and answer 202"""
+    job_id = uuid.uuid4()
+    path = job_file_path(job_id, ".csv")
+    with open(path, "wb") as f:
+        async for chunk in request.stream():
+            f.write(chunk)
+    
+    def enqueue():
+        db = SessionLocal()
+        try:
+            job = enqueue_job(
+                db, "import", {"resource": resource, "path": path, "created_by_id": str(current_user.id)},
+                tenant_id=tenant_id, created_by_id=str(current_user.id), job_id=job_id
+            )
+            db.commit()
+            return job_accepted(job)
+        finally:
+            db.close()
+    return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=await run_in_threadpool(enqueue))
+
+def _run_import(import_fn, spool, tenant_id: str, **kwargs) -> ImportReport:
+    db = SessionLocal()
+    try:
+        stream = io.TextIOWrapper(spool, encoding="utf-8", newline="")
+        try:
+            return import_fn(stream, tenant_id, db, **kwargs)
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=400, detail="CSV must be UTF-8 encoded")
+    finally:
+        db.close()
+        spool.close()
+
+@router.post("/tasks", response_model=ImportReport)
+async def import_tasks(
+    request: Request,
+    background: bool = Query(False),
+    current_user = Depends(get_current_user),
+    tenant_context: Optional[dict] = Depends(get_tenant_context)
+):
+    """Bulk import tasks from a CSV request body (admin only); ?background=true answers 202 with a job"""
+    tenant_id = _check_import_access(current_user, tenant_context)
+    if background:
+        return await _enqueue_import(request, "tasks", tenant_id, current_user)
+    spool = await _spool_body(request)
+    return await run_in_threadpool(
+        _run_import, import_tasks_csv, spool, tenant_id, created_by_id=str(current_user.id)
+    )
+
+@router.post("/users", response_model=ImportReport)
+async def import_users(
+    request: Request,
+    background: bool = Query(False),
+    current_user = Depends(get_current_user),
+    tenant_context: Optional[dict] = Depends(get_tenant_context)
+):
+    """Bulk import users from a CSV request body (admin only); ?background=true answers 202 with a job"""
+    tenant_id = _check_import_access(current_user, tenant_context)
+    if background:
+        return await _enqueue_import(request, "users", tenant_id, current_user)
+    spool = await _spool_body(request)
+    return await run_in_threadpool(_run_import, import_users_csv, spool, tenant_id)
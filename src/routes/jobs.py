@@ -0,0 +1,47 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+import os
+import uuid
+
+from ..unified_database import get_db, Job
+from ..dependencies import get_current_user
+from ..jobs import job_summary, job_file_path
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+def _get_own_job(job_id: str, current_user, db: Session) -> Job:
+    try:
+        job = db.get(Job, uuid.UUID(job_id))
+    except ValueError:
+        job = None
+    # Jobs of other users are reported as missing rather than forbidden
+    if not job or (current_user.userRole != "super_admin" and str(job.createdById) != str(current_user.id)):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
+
+@router.get("/{job_id}")
+async def get_job(
+    job_id: str,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get the status and result of a background job"""
+    return job_summary(_get_own_job(job_id, current_user, db))
+
+@router.get("/{job_id}/result")
+async def get_job_result(
+    job_id: str,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Download the file produced by a finished export job"""
+    job = _get_own_job(job_id, current_user, db)
+    if job.kind != "export":
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Job has no downloadable result")
+    if job.status != "succeeded":
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Job is {job.status}")
+    path = job_file_path(job.id, ".export")
+    if not os.path.exists(path):
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Export file has expired")
+    return FileResponse(path, media_type=job.result["media_type"], filename=job.result["filename"])
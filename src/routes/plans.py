@@ -3,11 +3,15 @@ from sqlalchemy.orm import Session
 
 from ..unified_database import get_db, get_plans
 from ..unified_models import PlansResponse
+from ..cache import plans_cache
 
 router = APIRouter(prefix="/plans", tags=["plans"])
 
+def get_plans_response(db: Session) -> PlansResponse:
+    """Available plans, served from the in-process cache"""
+    return plans_cache.get_or_load("all", lambda: PlansResponse(plans=get_plans(db)))
+
 @router.get("", response_model=PlansResponse)
 async def get_available_plans(db: Session = Depends(get_db)):
     """Get all available subscription plans"""
-    plans = get_plans(db)
-    return PlansResponse(plans=plans)
\ No newline at end of file
+    return get_plans_response(db)
\ No newline at end of file
@@ -0,0 +1,20 @@
+from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi.responses import FileResponse
+
+from ..dependencies import get_current_user
+from ..profiling import profile_path
+
+router = APIRouter(prefix="/profiles", tags=["profiles"])
+
+@router.get("/{profile_id}")
+def get_profile(profile_id: str, current_user = Depends(get_current_user)):
+    """Download a stored request profile (admin only)"""
+    if current_user.userRole != "super_admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only administrators can view profiles"
+        )
+    path = profile_path(profile_id)
+    if not path:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=path.rsplit("/", 1)[-1])
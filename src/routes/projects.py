@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Response
 from sqlalchemy.orm import Session
 from typing import Optional
 import json
@@ -10,9 +10,11 @@ from ..unified_models import (
 from ..unified_database import (
     get_db, get_user_by_id, create_project, get_project_by_id,
     get_all_projects, update_project, delete_project, get_tasks_by_project,
-    User, Project as DBProject, Task as DBTask
+    User, Project as DBProject, Task as DBTask, VersionConflictError
 )
-from ..dependencies import get_current_user, get_tenant_context
+from ..dependencies import get_current_user, get_tenant_context, get_if_match_version
+from ..usage import check_quota
+from ..tracing import traced
 
 router = APIRouter(prefix="/projects", tags=["projects"])
 
@@ -26,6 +28,7 @@ def transform_user_to_team_member(user: User) -> TeamMember:
         avatar=user.avatar
     )
 
+@traced()
 def transform_project_to_response(project: DBProject) -> Project:
     """Transform database project to response format"""
     return Project(
@@ -41,6 +44,7 @@ def transform_project_to_response(project: DBProject) -> Project:
         actualCost=project.actualCost,
         projectManager=transform_user_to_team_member(project.projectManager),
         teamMembers=[transform_user_to_team_member(member) for member in project.teamMembers],
+        version=project.version,
         createdAt=project.createdAt,
         updatedAt=project.updatedAt,
         notes=project.notes,
@@ -88,6 +92,7 @@ async def get_projects(
 @router.get("/{project_id}", response_model=Project)
 async def get_project(
     project_id: str, 
+    response: Response,
     db: Session = Depends(get_db),
     tenant_context: Optional[dict] = Depends(get_tenant_context)
 ):
@@ -97,6 +102,7 @@ async def get_project(
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
+    response.headers["ETag"] = f'"{project.version}"'
     return transform_project_to_response(project)
 
 @router.post("", response_model=Project)
@@ -107,6 +113,9 @@ async def create_new_project(
     tenant_context: Optional[dict] = Depends(get_tenant_context)
 ):
     """Create a new project"""
+    if tenant_context:
+        check_quota(db, tenant_context["tenant_id"], "projects")
+    
     # Verify project manager exists
     project_manager = get_user_by_id(project_data.projectManagerId, db)
     if not project_manager:
@@ -148,17 +157,22 @@ async def create_new_project(
 async def update_existing_project(
     project_id: str, 
     project_data: ProjectUpdate, 
+    response: Response,
     current_user = Depends(get_current_user),
     db: Session = Depends(get_db),
-    tenant_context: Optional[dict] = Depends(get_tenant_context)
+    tenant_context: Optional[dict] = Depends(get_tenant_context),
+    if_match_version: Optional[int] = Depends(get_if_match_version)
 ):
-    """Update a project"""
+    """Update a project (compare-and-swap when If-Match or version is supplied)"""
     tenant_id = tenant_context["tenant_id"] if tenant_context else None
     project = get_project_by_id(project_id, db, tenant_id=tenant_id)
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
     update_dict = project_data.dict(exclude_unset=True)
+    expected_version = update_dict.pop('version', None)
+    if if_match_version is not None:
+        expected_version = if_match_version
     
     # Handle team members update
     if 'teamMemberIds' in update_dict:
@@ -175,8 +189,15 @@ async def update_existing_project(
         project.teamMembers = team_members
     
     # Update other fields
-    updated_project = update_project(project_id, update_dict, db, tenant_id=tenant_id)
+    try:
+        updated_project = update_project(project_id, update_dict, db, tenant_id=tenant_id,
+                                         expected_version=expected_version)
+    except VersionConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if not updated_project:
+        raise HTTPException(status_code=404, detail="Project not found")
     
+    response.headers["ETag"] = f'"{updated_project.version}"'
     return transform_project_to_response(updated_project)
 
 @router.delete("/{project_id}")
@@ -194,6 +215,7 @@ async def delete_existing_project(
     
     return {"message": "Project deleted successfully"}
 
+@traced()
 def transform_task_to_response(task: DBTask):
     """Transform database task to response format for project tasks"""
     return Task(
@@ -217,6 +239,7 @@ def transform_task_to_response(task: DBTask):
             "name": f"{task.createdBy.firstName or ''} {task.createdBy.lastName or ''}".strip() or task.createdBy.userName,
             "email": task.createdBy.email
         },
+        version=task.version,
         completedAt=task.completedAt,
         createdAt=task.createdAt,
         updatedAt=task.updatedAt
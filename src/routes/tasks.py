@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Response
 from sqlalchemy.orm import Session
 from typing import Optional
 import json
@@ -9,12 +9,14 @@ from ..unified_database import (
     get_db, get_user_by_email, get_user_by_id,
     get_project_by_id, create_task, get_task_by_id, get_all_tasks,
     get_tasks_by_project, update_task, delete_task,
-    Task as DBTask
+    Task as DBTask, VersionConflictError
 )
-from ..dependencies import get_current_user, get_tenant_context
+from ..dependencies import get_current_user, get_tenant_context, get_if_match_version
+from ..tracing import traced
 
 router = APIRouter(prefix="/tasks", tags=["tasks"])
 
+@traced()
 def transform_task_to_response(task: DBTask) -> Task:
     """Transform database task to response format"""
     return Task(
@@ -38,6 +40,7 @@ def transform_task_to_response(task: DBTask) -> Task:
             "name": f"{task.createdBy.firstName or ''} {task.createdBy.lastName or ''}".strip() or task.createdBy.userName,
             "email": task.createdBy.email
         },
+        version=task.version,
         completedAt=task.completedAt,
         createdAt=task.createdAt,
         updatedAt=task.updatedAt
@@ -83,6 +86,7 @@ async def get_tasks(
 @router.get("/{task_id}", response_model=Task)
 async def get_task(
     task_id: str, 
+    response: Response,
     db: Session = Depends(get_db),
     tenant_context: Optional[dict] = Depends(get_tenant_context)
 ):
@@ -92,6 +96,7 @@ async def get_task(
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     
+    response.headers["ETag"] = f'"{task.version}"'
     return transform_task_to_response(task)
 
 @router.post("", response_model=Task)
@@ -136,17 +141,22 @@ async def create_new_task(
 async def update_existing_task(
     task_id: str, 
     task_data: TaskUpdate, 
+    response: Response,
     current_user = Depends(get_current_user),
     db: Session = Depends(get_db),
-    tenant_context: Optional[dict] = Depends(get_tenant_context)
+    tenant_context: Optional[dict] = Depends(get_tenant_context),
+    if_match_version: Optional[int] = Depends(get_if_match_version)
 ):
-    """Update a task"""
+    """Update a task (compare-and-swap when If-Match or version is supplied)"""
     tenant_id = tenant_context["tenant_id"] if tenant_context else None
     task = get_task_by_id(task_id, db, tenant_id=tenant_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     
     update_dict = task_data.dict(exclude_unset=True)
+    expected_version = update_dict.pop('version', None)
+    if if_match_version is not None:
+        expected_version = if_match_version
     
     # Handle assignee update
     if 'assignedTo' in update_dict:
@@ -168,8 +178,15 @@ async def update_existing_task(
     if update_dict.get('status') == 'completed' and task.status != 'completed':
         update_dict['completedAt'] = datetime.utcnow()
     
-    updated_task = update_task(task_id, update_dict, db, tenant_id=tenant_id)
+    try:
+        updated_task = update_task(task_id, update_dict, db, tenant_id=tenant_id,
+                                   expected_version=expected_version)
+    except VersionConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if not updated_task:
+        raise HTTPException(status_code=404, detail="Task not found")
     
+    response.headers["ETag"] = f'"{updated_task.version}"'
     return transform_task_to_response(updated_task)
 
 @router.delete("/{task_id}")
@@ -7,7 +7,8 @@ import uuid
 from ..unified_database import (
     get_db, get_plans, get_plan_by_id, create_tenant, 
     create_subscription, create_tenant_user, get_user_tenants,
-    get_tenant_by_id, get_tenant_users, get_subscription_by_tenant
+    get_tenant_by_id, get_tenant_users, get_subscription_by_tenant,
+    get_user_tenant_overview
 )
 from ..unified_models import (
     Plan, PlansResponse, TenantCreate, Tenant, SubscriptionCreate,
@@ -15,23 +16,70 @@ from ..unified_models import (
     SubscribeRequest
 )
 from ..dependencies import get_current_user
+from ..cache import tenant_cache, my_tenants_cache
+from ..tenant_resolver import tenant_domain_map
+from ..usage import get_usage_and_limits
+from ..jobs import enqueue_job, job_accepted
+from ..subscriptions import publish_subscription_state, subscription_state
+from .plans import get_plans_response
 
 router = APIRouter(prefix="/tenants", tags=["tenants"])
 
+def tenant_summary(tenant) -> dict:
+    """Cacheable tenant details (plain values, safe to share across sessions)"""
+    return {
+        "id": str(tenant.id),
+        "name": tenant.name,
+        "domain": tenant.domain,
+        "description": tenant.description,
+        "settings": tenant.settings,
+        "created_at": tenant.createdAt
+    }
+
+def my_tenant_entry(tenant_user, tenant, subscription, plan, usage) -> dict:
+    return {
+        "id": str(tenant.id),
+        "name": tenant.name,
+        "domain": tenant.domain,
+        "role": tenant_user.role,
+        "joined_at": tenant_user.joinedAt,
+        "subscription": {
+            "status": subscription.status,
+            "trial_ends": subscription.endDate if subscription.status == SubscriptionStatus.TRIAL.value else None,
+            "end_date": subscription.endDate
+        } if subscription else None,
+        "plan": {
+            "id": str(plan.id),
+            "name": plan.name,
+            "plan_type": plan.planType,
+            "max_projects": plan.maxProjects,
+            "max_users": plan.maxUsers
+        } if plan else None,
+        "usage": {
+            "projects": usage.projects if usage else 0,
+            "users": usage.users if usage else 0
+        }
+    }
+
+def get_tenant_summary(tenant_id: str, db: Session):
+    def load():
+        tenant = get_tenant_by_id(tenant_id, db)
+        return tenant_summary(tenant) if tenant else None
+    return tenant_cache.get_or_load(tenant_id, load)
+
 @router.get("/plans", response_model=PlansResponse)
 async def get_available_plans(db: Session = Depends(get_db)):
     """Get all available subscription plans"""
-    plans = get_plans(db)
-    return PlansResponse(plans=plans)
+    return get_plans_response(db)
 
-@router.post("/subscribe")
+@router.post("/subscribe", status_code=status.HTTP_202_ACCEPTED)
 async def subscribe_to_plan(
     plan_id: str,
     tenant_name: str,
     current_user = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Subscribe to a plan and create a new tenant"""
+    """Subscribe to a plan and create a new tenant; its sample content is provisioned by a background job"""
     
     # Verify plan exists
     plan = get_plan_by_id(plan_id, db)
@@ -49,7 +97,8 @@ async def subscribe_to_plan(
         "settings": {}
     }
     
-    tenant = create_tenant(tenant_data, db)
+    # Tenant, subscription, owner membership and provisioning job commit together
+    tenant = create_tenant(tenant_data, db, commit=False)
     
     # Create subscription (trial for now)
     subscription_data = {
@@ -61,7 +110,7 @@ async def subscribe_to_plan(
         "autoRenew": True
     }
     
-    subscription = create_subscription(subscription_data, db)
+    subscription = create_subscription(subscription_data, db, commit=False)
     
     # Add user as owner
     tenant_user_data = {
@@ -72,7 +121,17 @@ async def subscribe_to_plan(
         "isActive": True
     }
     
-    tenant_user = create_tenant_user(tenant_user_data, db)
+    create_tenant_user(tenant_user_data, db, commit=False)
+    
+    job = enqueue_job(
+        db, "provision_tenant", {"tenant_id": str(tenant.id), "owner_id": str(current_user.id)},
+        tenant_id=str(tenant.id), created_by_id=str(current_user.id)
+    )
+    db.commit()
+    
+    tenant_domain_map.add(tenant.domain, str(tenant.id))
+    publish_subscription_state(tenant.id, subscription_state(subscription))
+    my_tenants_cache.invalidate(str(current_user.id))
     
     return {
         "success": True,
@@ -86,7 +145,8 @@ async def subscribe_to_plan(
             "id": str(subscription.id),
             "status": subscription.status,
             "trial_ends": subscription.endDate
-        }
+        },
+        "provisioning": job_accepted(job)
     }
 
 @router.get("/my-tenants")
@@ -94,22 +154,11 @@ async def get_my_tenants(
     current_user = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get all tenants for the current user"""
-    tenant_users = get_user_tenants(str(current_user.id), db)
-    
-    tenants = []
-    for tenant_user in tenant_users:
-        tenant = get_tenant_by_id(str(tenant_user.tenantId), db)
-        if tenant:
-            tenants.append({
-                "id": str(tenant.id),
-                "name": tenant.name,
-                "domain": tenant.domain,
-                "role": tenant_user.role,
-                "joined_at": tenant_user.joinedAt
-            })
-    
-    return {"tenants": tenants}
+    """Get all tenants for the current user, with subscription, plan and usage for the tenant switcher"""
+    user_id = str(current_user.id)
+    return my_tenants_cache.get_or_load(user_id, lambda: {"tenants": [
+        my_tenant_entry(*row) for row in get_user_tenant_overview(user_id, db)
+    ]})
 
 @router.get("/{tenant_id}")
 async def get_tenant(
@@ -118,7 +167,7 @@ async def get_tenant(
     db: Session = Depends(get_db)
 ):
     """Get tenant details"""
-    tenant = get_tenant_by_id(tenant_id, db)
+    tenant = get_tenant_summary(tenant_id, db)
     if not tenant:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -135,15 +184,7 @@ async def get_tenant(
             detail="Access denied to this tenant"
         )
     
-    return {
-        "id": str(tenant.id),
-        "name": tenant.name,
-        "domain": tenant.domain,
-        "description": tenant.description,
-        "settings": tenant.settings,
-        "user_role": user_tenant.role,
-        "created_at": tenant.createdAt
-    }
+    return {**tenant, "user_role": user_tenant.role}
 
 @router.get("/{tenant_id}/users", response_model=TenantUsersResponse)
 async def get_tenant_users_list(
@@ -167,4 +208,20 @@ async def get_tenant_users_list(
     return TenantUsersResponse(
         users=tenant_users,
         pagination={"total": len(tenant_users), "page": 1, "per_page": 50}
-    )
\ No newline at end of file
+    )
+
+@router.get("/{tenant_id}/usage")
+async def get_tenant_usage(
+    tenant_id: str,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get the tenant's usage counters and plan limits (for billing)"""
+    user_tenants = get_user_tenants(str(current_user.id), db)
+    if not any(str(tu.tenantId) == tenant_id for tu in user_tenants):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied to this tenant"
+        )
+    
+    return {"tenant_id": tenant_id, **get_usage_and_limits(tenant_id, db)}
@@ -2,13 +2,15 @@ from fastapi import APIRouter, HTTPException, status, Depends
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
-from ..unified_models import User, UserCreate, UserUpdate, UsersResponse
+from ..unified_models import User, UserCreate, UserUpdate, UsersResponse, TenantRole
 from ..unified_database import (
-    get_db, get_user_by_email, get_user_by_username,
-    get_user_by_id, create_user, get_all_users
+    TenantUser, get_db, get_user_by_email, get_user_by_username,
+    get_user_by_id, create_user, create_tenant_user, get_all_users
 )
 from ..auth import get_password_hash
 from ..dependencies import get_current_user, get_tenant_context
+from ..usage import check_quota
+from ..cache import invalidate_tenant_members
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -76,6 +78,9 @@ async def create_new_user(
             detail="Only administrators can create users"
         )
     
+    if tenant_context:
+        check_quota(db, tenant_context["tenant_id"], "users")
+    
     # Check if user already exists
     if get_user_by_email(user_data.email, db):
         raise HTTPException(status_code=400, detail="Email already registered")
@@ -91,8 +96,19 @@ async def create_new_user(
     # Set tenant_id if tenant context is provided
     if tenant_context:
         user_dict['tenant_id'] = tenant_context["tenant_id"]
-    
-    db_user = create_user(user_dict, db)
+        # The membership is what the users quota counts; commit both together
+        db_user = create_user(user_dict, db, commit=False)
+        create_tenant_user({
+            "tenantId": tenant_context["tenant_id"],
+            "userId": db_user.id,
+            "role": TenantRole.MEMBER.value,
+            "permissions": [],
+            "isActive": True,
+            "invitedBy": current_user.id
+        }, db)
+        invalidate_tenant_members(tenant_context["tenant_id"], db)
+    else:
+        db_user = create_user(user_dict, db)
     
     return User(
         userId=str(db_user.id),
@@ -181,8 +197,15 @@ async def delete_user(
             detail="You cannot delete your own account"
         )
     
-    # Soft delete (set inactive)
+    # Soft delete (set inactive); ending the memberships too frees the user's seat in the users quota
     user.isActive = False
+    memberships = db.query(TenantUser).filter(
+        TenantUser.userId == user.id, TenantUser.isActive == True
+    ).all()
+    for membership in memberships:
+        membership.isActive = False
     db.commit()
+    for membership in memberships:
+        invalidate_tenant_members(membership.tenantId, db)
     
     return {"message": "User deleted successfully"}
\ No newline at end of file
@@ -0,0 +1,106 @@
+"""
+Subscription expiry.
+
+A periodic job (expire_subscriptions, every SUBSCRIPTION_SWEEP_INTERVAL
+seconds) moves trials past their endDate, and active subscriptions past it
+without autoRenew, to `expired`. It works in batches of SUBSCRIPTION_SWEEP_BATCH
+rows, using one UPDATE ... RETURNING per batch on the (status, endDate) index.
+
+Requests read the tenant's latest subscription state from subscription_cache,
+which is loaded on a miss and kept for SUBSCRIPTION_CACHE_TTL seconds, so
+checking a request is a memory lookup. The sweeper does not touch any cache:
+it may run in another process. Blocking does not depend on it either, because
+the endDate is compared at request time with the same rule the sweeper
+applies, so a lapsed subscription is blocked as soon as its endDate passes.
+Other status changes (e.g. a cancellation in another worker) are seen within
+SUBSCRIPTION_CACHE_TTL. Tenants without a usable subscription get 402 on
+writes. Reads still work, so users can export data and upgrade.
+"""
+import os
+from datetime import datetime
+
+from fastapi import HTTPException, status
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .cache import app_cache
+from .unified_database import Subscription
+from .unified_models import SubscriptionStatus
+
+SUBSCRIPTION_SWEEP_BATCH = int(os.getenv("SUBSCRIPTION_SWEEP_BATCH", 1000))
+
+# Latest subscription state per tenant id: {"status", "end_date", "auto_renew"}
+subscription_cache = app_cache("subscriptions", float(os.getenv("SUBSCRIPTION_CACHE_TTL", 60)))
+
+BLOCKED_STATUSES = {
+    SubscriptionStatus.EXPIRED.value, SubscriptionStatus.CANCELLED.value, SubscriptionStatus.INACTIVE.value
+}
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+EXPIRE_BATCH_SQL = text("""
+    WITH due AS (
+        SELECT id FROM subscriptions
+        WHERE (status = 'trial' AND "endDate" < :now)
+           OR (status = 'active' AND "endDate" < :now AND NOT COALESCE("autoRenew", false))
+        ORDER BY "endDate"
+        LIMIT :batch
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE subscriptions s SET status = 'expired', "updatedAt" = :now
+    FROM due WHERE s.id = due.id
+""")
+
+def subscription_state(subscription) -> dict:
+    return {
+        "status": subscription.status,
+        "end_date": subscription.endDate,
+        "auto_renew": subscription.autoRenew,
+    }
+
+def publish_subscription_state(tenant_id, state: dict):
+    """Make `state` the tenant's cached subscription state in this worker (read-your-writes only)"""
+    subscription_cache.set(str(tenant_id), state)
+
+def expire_due_subscriptions(db: Session) -> int:
+    """Expire lapsed subscriptions batch by batch; returns how many were expired.
+
+    Only the stored status changes: requests already treat these subscriptions
+    as lapsed from their endDate, so no cache has to be told.
+    """
+    expired = 0
+    while True:
+        batch = db.execute(EXPIRE_BATCH_SQL, {"now": datetime.utcnow(), "batch": SUBSCRIPTION_SWEEP_BATCH}).rowcount
+        db.commit()
+        expired += batch
+        if batch < SUBSCRIPTION_SWEEP_BATCH:
+            break
+    return expired
+
+def _load_state(tenant_id: str, db: Session):
+    subscription = db.query(Subscription).filter(
+        Subscription.tenantId == tenant_id
+    ).order_by(Subscription.createdAt.desc()).first()
+    # Tenants without any subscription (created before plans existed) are not restricted
+    return subscription_state(subscription) if subscription else {"status": None, "end_date": None, "auto_renew": None}
+
+def is_subscription_usable(state: dict, now: datetime = None) -> bool:
+    """Same rule as EXPIRE_BATCH_SQL, applied to a (possibly cached) state"""
+    if state["status"] is None:
+        return True
+    if state["status"] in BLOCKED_STATUSES:
+        return False
+    lapsed = state["end_date"] is not None and state["end_date"] < (now or datetime.utcnow())
+    if state["status"] == SubscriptionStatus.TRIAL.value:
+        return not lapsed
+    return not (lapsed and not state["auto_renew"])
+
+def check_subscription_allows(tenant_id: str, method: str, db: Session):
+    """Raise 402 for writes when the tenant's subscription has expired"""
+    if method in READ_METHODS:
+        return
+    state = subscription_cache.get_or_load(tenant_id, lambda: _load_state(tenant_id, db))
+    if not is_subscription_usable(state):
+        raise HTTPException(
+            status_code=status.HTTP_402_PAYMENT_REQUIRED,
+            detail="The workspace subscription has expired; renew it to make changes"
+        )
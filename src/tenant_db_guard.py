@@ -0,0 +1,126 @@
+"""
+Per-tenant guards at the database.
+
+Once get_tenant_context knows the tenant, every transaction of that request's
+session runs with:
+
+- statement_timeout from the tenant's plan (PLAN_DB_LIMITS), so a single
+  heavy query cannot hold a pooled connection for long
+- one of the tenant's `db_sessions` slots, taken with pg_try_advisory_lock.
+  The lock lives in Postgres, so the cap holds across workers and hosts.
+  When all slots are taken the request gets 429 at once: waiting would hold
+  a pooled connection, and a busy tenant's queued requests could then drain
+  the pool the cap is meant to protect.
+
+Both are set by one extra statement per transaction. When the connection goes
+back to the pool, its advisory locks are released and statement_timeout is
+reset. Statement timeouts are counted per tenant in
+db_statement_timeouts_total and returned to the client as 503.
+"""
+import logging
+import os
+import zlib
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from .metrics import Counter, tenant_label
+
+logger = logging.getLogger("sparkco.db")
+
+PLAN_DB_LIMITS = {
+    "starter": {"statement_timeout_ms": 5000, "db_sessions": 3},
+    "professional": {"statement_timeout_ms": 15000, "db_sessions": 8},
+    "enterprise": {"statement_timeout_ms": 60000, "db_sessions": 20},
+}
+DEFAULT_PLAN = "starter"
+
+TENANT_DB_GUARDS = os.getenv("TENANT_DB_GUARDS", "true").lower() not in ("0", "false", "no")
+
+statement_timeouts = Counter(
+    "db_statement_timeouts_total", "Statements cancelled by the tenant statement_timeout", ("tenant",)
+)
+tenant_db_busy = Counter(
+    "tenant_db_sessions_rejected_total", "Requests rejected because the tenant had no free DB session slot",
+    ("tenant",)
+)
+
+class TenantDbBusyError(Exception):
+    """All of the tenant's concurrent DB session slots are in use"""
+
+class StatementTimeoutError(Exception):
+    """A statement ran longer than the tenant's statement_timeout"""
+
+GUARD_SQL = text("""
+    SELECT set_config('statement_timeout', :timeout, false),
+           (SELECT s FROM generate_series(0, :slots - 1) AS s
+            WHERE pg_try_advisory_lock(:lock_key, s) LIMIT 1)
+""")
+
+def _lock_key(tenant_id: str) -> int:
+    # Advisory lock keys are int4; distinct tenants may rarely share a key (and thus a cap)
+    return zlib.crc32(str(tenant_id).encode()) - 2 ** 31
+
+def _apply_guard(connection, guard: dict):
+    if connection.info.get("tenant_guard") == guard["tenant_id"]:
+        return
+    slot = connection.execute(GUARD_SQL, {
+        "timeout": str(guard["statement_timeout_ms"]),
+        "slots": guard["db_sessions"],
+        "lock_key": guard["lock_key"],
+    }).one()[1]
+    if slot is None:
+        # Fail at once; never wait for a slot while holding a pooled connection
+        tenant_db_busy.inc(tenant=tenant_label(guard["tenant_id"]))
+        raise TenantDbBusyError(f"Tenant {guard['tenant_id']} has no free database session")
+    connection.info["tenant_guard"] = guard["tenant_id"]
+
+# Engines whose pool resets guards on checkin; guards are only applied on those
+_guarded_engines = set()
+
+def guard_tenant_session(db: Session, tenant_id: str, plan_type):
+    """Apply the tenant's DB limits to this session, now and for each later transaction"""
+    if not TENANT_DB_GUARDS or id(db.get_bind()) not in _guarded_engines:
+        return
+    limits = PLAN_DB_LIMITS.get(plan_type or DEFAULT_PLAN, PLAN_DB_LIMITS[DEFAULT_PLAN])
+    guard = {"tenant_id": tenant_id, "lock_key": _lock_key(tenant_id), **limits}
+    db.info["tenant_guard"] = guard
+    _apply_guard(db.connection(), guard)
+
+def _after_begin(session, transaction, connection):
+    guard = session.info.get("tenant_guard")
+    if guard:
+        _apply_guard(connection, guard)
+
+def _on_checkin(dbapi_connection, connection_record):
+    if not connection_record.info.pop("tenant_guard", None) or dbapi_connection is None:
+        return
+    try:
+        cursor = dbapi_connection.cursor()
+        cursor.execute("SELECT pg_advisory_unlock_all(); RESET statement_timeout")
+        cursor.close()
+        dbapi_connection.commit()
+    except Exception as e:
+        # Never hand out a connection that may still hold a tenant's slot
+        logger.warning("could not reset tenant guard, discarding connection: %s", e)
+        connection_record.invalidate(e)
+
+def _handle_error(exception_context):
+    original = exception_context.original_exception
+    connection = exception_context.connection
+    if getattr(original, "pgcode", None) != "57014" or connection is None:
+        return None
+    tenant_id = connection.info.get("tenant_guard")
+    if not tenant_id:
+        return None
+    statement_timeouts.inc(tenant=tenant_label(tenant_id))
+    return StatementTimeoutError(f"Statement exceeded the statement timeout for tenant {tenant_id}")
+
+def install_tenant_db_guards(engine):
+    """Attach the guard listeners (idempotent)"""
+    if not event.contains(Session, "after_begin", _after_begin):
+        event.listen(Session, "after_begin", _after_begin)
+    if not event.contains(engine, "handle_error", _handle_error):
+        event.listen(engine.pool, "checkin", _on_checkin)
+        event.listen(engine, "handle_error", _handle_error)
+    _guarded_engines.add(id(engine))
@@ -0,0 +1,164 @@
+"""
+Tenant resolution from the Host header.
+
+Frontends served from a tenant subdomain (acme-1a2b3c4d.<TENANT_BASE_DOMAIN>)
+or from a tenant's own domain don't need to look up the tenant UUID first.
+When a request has no X-Tenant-ID header, this middleware maps its Host to a
+tenant and adds the header. get_tenant_context then builds the usual tenant
+context, including the membership check, so a forged Host gains nothing.
+
+The domain -> tenant id map holds every active tenant. It is loaded at
+startup, updated when a tenant is created in this worker, and reloaded every
+TENANT_DOMAIN_REFRESH_SECONDS so tenants created by other workers appear too.
+Without TENANT_BASE_DOMAIN, a host missing from the map is not a tenant and
+costs no query, so random Host headers can't reach the database. With it, a
+missing subdomain falls back to get_tenant_by_domain, and unknown hosts are
+cached negatively for a short time.
+"""
+import logging
+import os
+import threading
+import time
+
+from starlette.concurrency import run_in_threadpool
+
+from .cache import TTLCache
+from .metrics import record_cache_hit, record_cache_miss
+from .unified_database import DatabaseLocal, SessionLocal, Tenant, get_tenant_by_domain
+
+logger = logging.getLogger("sparkco.tenants")
+
+TENANT_BASE_DOMAIN = (os.getenv("TENANT_BASE_DOMAIN") or "").lower().strip(".")
+TENANT_DOMAIN_REFRESH_SECONDS = float(os.getenv("TENANT_DOMAIN_REFRESH_SECONDS", 60))
+NOT_A_TENANT_HOSTS = {"localhost", "127.0.0.1", "0.0.0.0", "testserver"}
+
+class TenantDomainMap:
+    """domain -> tenant id for every active tenant"""
+
+    def __init__(self):
+        self._domains = {}
+        self._lock = threading.Lock()
+        self._refreshing = threading.Lock()
+        self._loaded_at = None
+        self._missing = TTLCache("tenant_domains_missing", float(os.getenv("TENANT_DOMAIN_MISS_TTL", 30)))
+
+    def warm(self, db) -> int:
+        rows = db.query(Tenant.domain, Tenant.id).filter(
+            Tenant.domain.isnot(None), Tenant.isActive == True
+        ).all()
+        with self._lock:
+            self._domains = {domain.lower(): str(tenant_id) for domain, tenant_id in rows}
+            self._loaded_at = time.monotonic()
+        self._missing.clear()
+        return len(rows)
+
+    def is_stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > TENANT_DOMAIN_REFRESH_SECONDS
+
+    def refresh(self):
+        """Reload from the database, unless another thread already is"""
+        if not self._refreshing.acquire(blocking=False):
+            return
+        try:
+            db = SessionLocal()
+            try:
+                self.warm(db)
+            finally:
+                db.close()
+        except Exception as e:
+            logger.warning("could not refresh tenant domain map: %s", e)
+            # Keep serving the old map; try again after the next interval
+            self._loaded_at = time.monotonic()
+        finally:
+            self._refreshing.release()
+
+    def add(self, domain: str, tenant_id: str):
+        if not domain:
+            return
+        with self._lock:
+            self._domains[domain.lower()] = str(tenant_id)
+        self._missing.invalidate(domain.lower())
+
+    def remove(self, domain: str):
+        if domain:
+            with self._lock:
+                self._domains.pop(domain.lower(), None)
+
+    def clear(self):
+        with self._lock:
+            self._domains = {}
+        self._missing.clear()
+
+    def get(self, domain: str):
+        tenant_id = self._domains.get(domain)
+        if tenant_id:
+            record_cache_hit("tenant_domains")
+        else:
+            record_cache_miss("tenant_domains")
+        return tenant_id
+
+    def is_known_missing(self, domain: str) -> bool:
+        return self._missing.get(domain) is not None
+
+    def mark_missing(self, domain: str):
+        self._missing.set(domain, True)
+
+# One map per app (Database)
+tenant_domain_map = DatabaseLocal("tenant_domain_map", TenantDomainMap)
+
+def domain_for_host(host: str):
+    """Tenant domain for a Host header value, or None for hosts that can't be tenants"""
+    host = host.split(":", 1)[0].lower().strip(".")
+    if not host or host in NOT_A_TENANT_HOSTS or host == TENANT_BASE_DOMAIN:
+        return None
+    if TENANT_BASE_DOMAIN and host.endswith("." + TENANT_BASE_DOMAIN):
+        return host[:-len(TENANT_BASE_DOMAIN) - 1]
+    return host
+
+def _lookup_domain(domain: str):
+    db = SessionLocal()
+    try:
+        tenant = get_tenant_by_domain(domain, db)
+        return str(tenant.id) if tenant and tenant.isActive else None
+    finally:
+        db.close()
+
+async def resolve_tenant_id(domain: str):
+    domain_map = tenant_domain_map.current()
+    if domain_map.is_stale():
+        await run_in_threadpool(domain_map.refresh)
+    tenant_id = domain_map.get(domain)
+    if tenant_id or not TENANT_BASE_DOMAIN or domain_map.is_known_missing(domain):
+        # Without a base domain the map is complete, so a miss needs no query
+        return tenant_id
+    tenant_id = await run_in_threadpool(_lookup_domain, domain)
+    if tenant_id:
+        domain_map.add(domain, tenant_id)
+    else:
+        domain_map.mark_missing(domain)
+    return tenant_id
+
+class TenantHostMiddleware:
+    """Adds X-Tenant-ID from the Host header when the client didn't send one"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        host = None
+        for name, value in scope["headers"]:
+            if name == b"x-tenant-id":
+                await self.app(scope, receive, send)
+                return
+            if name == b"host":
+                host = value.decode("latin-1")
+
+        domain = domain_for_host(host) if host else None
+        tenant_id = await resolve_tenant_id(domain) if domain else None
+        if tenant_id:
+            scope = dict(scope, headers=list(scope["headers"]) + [(b"x-tenant-id", tenant_id.encode("latin-1"))])
+        await self.app(scope, receive, send)
@@ -0,0 +1,258 @@
+"""
+Lightweight request tracing.
+
+Each sampled request gets a root span. Child spans cover every FastAPI
+dependency (get_db, the bearer security scheme, get_current_user,
+get_tenant_context and get_if_match_version, each decorated with @traced), the
+wait for a pool connection, every SQL statement and the response serializers
+(transform_*_to_response). Trace context is read from and propagated through the W3C `traceparent`
+header. Finished traces go to a pluggable exporter; the default writes one JSON
+line per span to TRACE_FILE, or to the console when TRACE_FILE is unset.
+
+TRACE_SAMPLE_RATE (0-1, default 0) controls how many requests are traced; an
+incoming traceparent with the sampled flag set is always traced. Unsampled
+requests only pay for one context-variable lookup per span site.
+"""
+import contextvars
+import functools
+import inspect
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+from sqlalchemy import event
+from starlette.datastructures import Headers, MutableHeaders
+
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", 0))
+TRACE_FILE = os.getenv("TRACE_FILE")
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "attributes", "start", "end", "status")
+
+    def __init__(self, trace_id: str, parent_id, name: str, attributes=None):
+        self.trace_id = trace_id
+        self.span_id = "%016x" % random.getrandbits(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes or {}
+        self.start = time.time()
+        self.end = None
+        self.status = "ok"
+
+    def finish(self, error: BaseException = None):
+        self.end = time.time()
+        if error is not None:
+            self.status = "error"
+            self.attributes["error"] = repr(error)
+        exporter.export(self)
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": round(((self.end or time.time()) - self.start) * 1000, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+# Exporters
+class ConsoleExporter:
+    def export(self, span: Span):
+        sys.stderr.write(json.dumps(span.to_dict(), default=str) + "\n")
+
+class FileExporter:
+    """Appends spans as JSON lines to a local file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str) + "\n"
+        with self._lock, open(self.path, "a") as f:
+            f.write(line)
+
+exporter = FileExporter(TRACE_FILE) if TRACE_FILE else ConsoleExporter()
+
+def set_exporter(new_exporter):
+    """Plug in another exporter (any object with an export(span) method)"""
+    global exporter
+    exporter = new_exporter
+
+# Span helpers
+def current_span():
+    return _current_span.get()
+
+def start_span(name: str, **attributes):
+    """Start a child of the current span; returns (span, token) or (None, None) when not tracing"""
+    parent = _current_span.get()
+    if parent is None:
+        return None, None
+    span = Span(parent.trace_id, parent.span_id, name, attributes)
+    return span, _current_span.set(span)
+
+def end_span(span, token, error: BaseException = None):
+    if span is None:
+        return
+    _current_span.reset(token)
+    span.finish(error)
+
+def traced(name: str = None):
+    """Decorator adding a span around a sync, async or generator function.
+
+    functools.wraps keeps the signature visible to FastAPI's dependency injection.
+    For generators (yield dependencies) the span covers the setup up to the first
+    yield, not the teardown that runs after the endpoint.
+    """
+    def decorator(func):
+        span_name = name or func.__name__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                span, token = start_span(span_name)
+                try:
+                    result = await func(*args, **kwargs)
+                except BaseException as e:
+                    end_span(span, token, e)
+                    raise
+                end_span(span, token)
+                return result
+            return async_wrapper
+
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def generator_wrapper(*args, **kwargs):
+                span, token = start_span(span_name)
+                generator = func(*args, **kwargs)
+                try:
+                    value = next(generator)
+                except BaseException as e:
+                    end_span(span, token, e)
+                    raise
+                end_span(span, token)
+                try:
+                    yield value
+                except BaseException as e:
+                    try:
+                        generator.throw(e)
+                    except StopIteration:
+                        return
+                    raise RuntimeError(f"{span_name} did not stop after throw()")
+                try:
+                    next(generator)
+                except StopIteration:
+                    return
+                raise RuntimeError(f"{span_name} yielded more than once")
+            return generator_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            span, token = start_span(span_name)
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as e:
+                end_span(span, token, e)
+                raise
+            end_span(span, token)
+            return result
+        return wrapper
+    return decorator
+
+# W3C trace context
+def parse_traceparent(value):
+    """Return (trace_id, parent_span_id, sampled) or None for a malformed header"""
+    if not value:
+        return None
+    parts = value.strip().split("-")
+    if len(parts) < 4 or len(parts[0]) != 2 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    version, trace_id, parent_id, flags = parts[:4]
+    if version == "ff" or trace_id == "0" * 32 or parent_id == "0" * 16:
+        return None
+    try:
+        int(trace_id, 16)
+        int(parent_id, 16)
+        sampled = bool(int(flags, 16) & 0x01)
+    except ValueError:
+        return None
+    return trace_id, parent_id, sampled
+
+def format_traceparent(span: Span) -> str:
+    return f"00-{span.trace_id}-{span.span_id}-01"
+
+# SQL statement spans
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    span, token = start_span("db.query", statement=" ".join(statement.split())[:500])
+    conn.info.setdefault("trace_spans", []).append((span, token))
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    spans = conn.info.get("trace_spans")
+    if spans:
+        span, token = spans.pop()
+        end_span(span, token)
+
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    spans = conn.info.get("trace_spans") if conn is not None else None
+    if spans:
+        span, token = spans.pop()
+        end_span(span, token, exception_context.original_exception)
+
+def install_sql_tracing(engine):
+    """Attach statement span listeners to an engine (idempotent)"""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+
+class TracingMiddleware:
+    """Starts the root span per sampled request and propagates traceparent"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = parse_traceparent(Headers(scope=scope).get("traceparent"))
+        if incoming:
+            trace_id, parent_id, sampled = incoming
+        else:
+            trace_id, parent_id = "%032x" % random.getrandbits(128), None
+            sampled = False
+        if not sampled and not (TRACE_SAMPLE_RATE and random.random() < TRACE_SAMPLE_RATE):
+            await self.app(scope, receive, send)
+            return
+
+        root = Span(trace_id, parent_id, f"{scope['method']} {scope['path']}", {"http.method": scope["method"]})
+        token = _current_span.set(root)
+
+        async def send_with_trace(message):
+            if message["type"] == "http.response.start":
+                root.attributes["http.status_code"] = message["status"]
+                MutableHeaders(scope=message).append("traceparent", format_traceparent(root))
+            await send(message)
+
+        error = None
+        try:
+            await self.app(scope, receive, send_with_trace)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            route = scope.get("route")
+            if route is not None:
+                root.name = f"{scope['method']} {route.path}"
+            _current_span.reset(token)
+            root.finish(error)
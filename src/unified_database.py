@@ -1,18 +1,133 @@
+import contextvars
 import os
+import threading
 import uuid
+import weakref
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any
-from sqlalchemy import create_engine, Column, String, Boolean, DateTime, Float, Integer, Text, JSON, ForeignKey, Table
+from sqlalchemy import event, create_engine, select, text, and_, Column, String, Boolean, DateTime, Float, Integer, Text, JSON, ForeignKey, Table, LargeBinary, UniqueConstraint, Index
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session, relationship
-from sqlalchemy.dialects.postgresql import UUID
-from dotenv import load_dotenv
-
-load_dotenv()
-DATABASE_URL = os.getenv("DATABASE_URL")
-
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+from sqlalchemy.orm import sessionmaker, Session, relationship, aliased, joinedload, selectinload
+from sqlalchemy.dialects.postgresql import UUID, insert as pg_insert
+from sqlalchemy.exc import ProgrammingError
+
+from .config import Settings, get_settings
+from .metrics import TimedQueuePool
+from .tracing import traced
+
+# Bump together with a new entry in migrate.MIGRATIONS
+SCHEMA_VERSION = 7
+
+class Database:
+    """Engine, pool and session factory for one configuration"""
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.engine = create_engine(
+            settings.database_url,
+            poolclass=TimedQueuePool,
+            pool_size=settings.pool_size,
+            max_overflow=settings.max_overflow,
+            pool_timeout=settings.pool_timeout,
+            pool_recycle=settings.pool_recycle,
+        )
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        event.listen(self.engine.pool, "checkin", _forget_statement_connection)
+        # Per-app objects (caches, job worker, ...) kept here rather than in module globals
+        self.locals = {}
+        self._locals_lock = threading.Lock()
+        _databases.add(self)
+
+    def local(self, key: str, factory):
+        """This Database's object for `key`, created with factory() on first use"""
+        value = self.locals.get(key)
+        if value is None:
+            with self._locals_lock:
+                value = self.locals.get(key)
+                if value is None:
+                    value = self.locals[key] = factory()
+        return value
+
+    def drop_local(self, key: str):
+        with self._locals_lock:
+            return self.locals.pop(key, None)
+
+    def clear_locals(self):
+        with self._locals_lock:
+            self.locals.clear()
+
+    def dispose(self, close: bool = True):
+        """Drop pooled connections; close=False after fork, so the parent's sockets stay open"""
+        self.engine.dispose(close=close)
+
+class DatabaseLocal:
+    """Module-level handle for an object kept per Database, i.e. per app.
+
+    Attribute access goes to the current Database's instance, created by
+    `factory` on first use, so apps in one process never share it.
+    """
+
+    def __init__(self, key: str, factory):
+        self._key = key
+        self._factory = factory
+
+    def current(self):
+        return get_database().local(self._key, self._factory)
+
+    def __getattr__(self, name):
+        return getattr(self.current(), name)
+
+_databases = weakref.WeakSet()
+
+def _dispose_after_fork():
+    # Connections inherited from the parent must never be used by the child
+    for database in list(_databases):
+        database.dispose(close=False)
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_dispose_after_fork)
+
+_current_database = contextvars.ContextVar("current_database", default=None)
+_default_database = None
+_default_lock = threading.Lock()
+
+def get_database() -> Database:
+    """Database of the app serving the current request, else a process default built from the environment"""
+    global _default_database
+    database = _current_database.get()
+    if database is not None:
+        return database
+    if _default_database is None:
+        with _default_lock:
+            if _default_database is None:
+                _default_database = Database(get_settings())
+    return _default_database
+
+def use_database(database: Database):
+    """Make `database` current in this context; returns a token for reset_database()"""
+    return _current_database.set(database)
+
+def reset_database(token):
+    _current_database.reset(token)
+
+def get_engine():
+    """Engine of the current Database (created on first use, never at import)"""
+    return get_database().engine
+
+def __getattr__(name):
+    # Keeps `from .unified_database import engine` working without creating it at import
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+class _SessionFactory:
+    """Opens sessions on the current Database; drop-in for a sessionmaker"""
+
+    def __call__(self, **kwargs) -> Session:
+        return get_database().SessionLocal(**kwargs)
+
+SessionLocal = _SessionFactory()
 Base = declarative_base()
 
 # Association tables
@@ -87,6 +202,8 @@ class Plan(Base):
 
 class Subscription(Base):
     __tablename__ = "subscriptions"
+    # Used by the expiry sweeper (src/subscriptions.py)
+    __table_args__ = (Index("ix_subscriptions_status_endDate", "status", "endDate"),)
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
     tenantId = Column(UUID(as_uuid=True), ForeignKey("tenants.id"), nullable=False)
@@ -135,6 +252,7 @@ class Project(Base):
     actualCost = Column(Float, default=0.0)
     projectManagerId = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     notes = Column(Text)
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # Optimistic concurrency token
     createdAt = Column(DateTime, default=datetime.utcnow)
     updatedAt = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -161,6 +279,7 @@ class Task(Base):
     actualHours = Column(Float, default=0.0)
     tags = Column(Text)  # JSON string
     completedAt = Column(DateTime)
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # Optimistic concurrency token
     createdAt = Column(DateTime, default=datetime.utcnow)
     updatedAt = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -169,16 +288,196 @@ class Task(Base):
     assignedTo = relationship("User", foreign_keys=[assignedToId], back_populates="assigned_tasks")
     createdBy = relationship("User", foreign_keys=[createdById], back_populates="created_tasks")
 
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (UniqueConstraint("scope", "key", name="uq_idempotency_keys_scope_key"),)
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    scope = Column(String, nullable=False)  # owner of the key: user email + tenant id
+    key = Column(String(255), nullable=False)
+    requestHash = Column(String(64), nullable=False)  # sha256 of method, path, query and body
+    status = Column(String, nullable=False, default="in_progress")  # in_progress, completed
+    responseStatus = Column(Integer)
+    responseContentType = Column(String)
+    responseBody = Column(LargeBinary)
+    createdAt = Column(DateTime, default=datetime.utcnow)
+    lockedAt = Column(DateTime)  # refreshed while the claiming request runs
+    expiresAt = Column(DateTime, nullable=False, index=True)
+
+class TenantUsage(Base):
+    __tablename__ = "tenant_usage"
+
+    # Maintained incrementally by src.usage and corrected by reconcile_usage()
+    tenantId = Column(UUID(as_uuid=True), ForeignKey("tenants.id"), primary_key=True)
+    projects = Column(Integer, nullable=False, default=0)
+    users = Column(Integer, nullable=False, default=0)
+    tasks = Column(Integer, nullable=False, default=0)
+    reconciledAt = Column(DateTime)
+    updatedAt = Column(DateTime, default=datetime.utcnow)
+
+class Job(Base):
+    __tablename__ = "jobs"
+    # Workers claim the oldest due job with FOR UPDATE SKIP LOCKED
+    __table_args__ = (Index("ix_jobs_status_runAt", "status", "runAt"),)
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    kind = Column(String, nullable=False)  # provision_tenant, export, import, purge_idempotency_keys, ...
+    tenantId = Column(UUID(as_uuid=True), ForeignKey("tenants.id"))
+    createdById = Column(UUID(as_uuid=True), ForeignKey("users.id"))
+    payload = Column(JSON, nullable=False, default=dict)
+    status = Column(String, nullable=False, default="queued")  # queued, running, succeeded, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    maxAttempts = Column(Integer, nullable=False, default=5)
+    runAt = Column(DateTime, nullable=False, default=datetime.utcnow)
+    lockedAt = Column(DateTime)
+    lockedBy = Column(String)
+    result = Column(JSON)
+    error = Column(Text)
+    createdAt = Column(DateTime, default=datetime.utcnow)
+    finishedAt = Column(DateTime)
+
+class VersionConflictError(Exception):
+    """Raised when a compare-and-swap update finds a newer row version"""
+    def __init__(self, current_version: int):
+        super().__init__(f"Row was modified concurrently (current version {current_version})")
+        self.current_version = current_version
+
 # Database functions
+class SchemaVersionError(RuntimeError):
+    """The database schema is not at the version this code expects"""
+
+class SchemaVersion(Base):
+    __tablename__ = "schema_version"
+
+    version = Column(Integer, primary_key=True)
+    description = Column(String, nullable=False)
+    appliedAt = Column(DateTime, default=datetime.utcnow)
+
 def create_tables():
-    Base.metadata.create_all(bind=engine)
+    """Create or upgrade the schema to SCHEMA_VERSION (same as `python -m src.migrate`)"""
+    from .migrate import migrate
+    migrate()
 
+def get_schema_version(connection) -> Optional[int]:
+    """Applied schema version, or None when migrations have never run"""
+    try:
+        with connection.begin_nested():
+            return connection.execute(text("SELECT max(version) FROM schema_version")).scalar()
+    except ProgrammingError:
+        return None
+
+def check_schema_version():
+    """Single lookup at startup; refuses to run against a schema this code doesn't match"""
+    with get_engine().connect() as connection:
+        version = get_schema_version(connection)
+    if version != SCHEMA_VERSION:
+        raise SchemaVersionError(
+            f"Database schema version is {version}, this code requires {SCHEMA_VERSION}. "
+            "Run `python -m src.migrate` first."
+        )
+
+# Resources held by the current request's yield dependencies. When admission control
+# cancels a request, FastAPI skips those dependencies' teardown; the middleware then
+# releases what is listed here instead.
+_request_resources = contextvars.ContextVar("request_resources", default=None)
+
+class _RequestResource:
+    """release() runs once, from the dependency or from the middleware, whichever comes first"""
+
+    def __init__(self, release, cancel=None):
+        self.cancel = cancel
+        self._release = release
+        self._lock = threading.Lock()
+        self._released = False
+
+    def release(self):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._release()
+
+@contextmanager
+def request_resource(release, cancel=None):
+    """Call release() when the block ends, or in release_request_resources() if the request is cancelled.
+
+    cancel(), if given, interrupts work in progress on the resource from another thread.
+    """
+    resource = _RequestResource(release, cancel)
+    resources = _request_resources.get()
+    if resources is not None:
+        resources.append(resource)
+    try:
+        yield
+    finally:
+        resource.release()
+
+def use_request_resources(resources: list):
+    """Collect the request_resource()s opened in this context into `resources`"""
+    return _request_resources.set(resources)
+
+def reset_request_resources(token):
+    _request_resources.reset(token)
+
+def cancel_request_work(resources: list):
+    for resource in list(resources):
+        if resource.cancel:
+            try:
+                resource.cancel()
+            except Exception:
+                # Best effort: the work then simply runs to completion
+                pass
+
+def release_request_resources(resources: list):
+    """Release in reverse order of acquisition; one failure doesn't keep the others held"""
+    error = None
+    for resource in reversed(resources):
+        try:
+            resource.release()
+        except Exception as e:
+            error = error or e
+    if error:
+        raise error
+
+# Guards the session <-> DBAPI connection link so a cancel never reaches a connection
+# that went back to the pool and now runs another request's statement
+_statement_lock = threading.Lock()
+
+@event.listens_for(Session, "after_begin")
+def _remember_statement_connection(session, transaction, connection):
+    with _statement_lock:
+        session.info["dbapi_connection"] = connection.connection.dbapi_connection
+        connection.info["statement_owner"] = session.info
+
+def _forget_statement_connection(dbapi_connection, connection_record):
+    owner = connection_record.info.pop("statement_owner", None)
+    if owner is not None:
+        with _statement_lock:
+            owner.pop("dbapi_connection", None)
+
+def cancel_statement(db: Session):
+    """Cancel the statement `db` is running, if any; safe to call from another thread"""
+    with _statement_lock:
+        dbapi_connection = db.info.get("dbapi_connection")
+        if dbapi_connection is not None and hasattr(dbapi_connection, "cancel"):
+            dbapi_connection.cancel()
+
+@traced()
 def get_db():
     db = SessionLocal()
-    try:
+    with request_resource(db.close, cancel=lambda: cancel_statement(db)):
         yield db
-    finally:
-        db.close()
+
+def _save(db: Session, obj, commit: bool):
+    """Add obj; commit and refresh it, or with commit=False only flush it into the caller's transaction"""
+    db.add(obj)
+    if commit:
+        db.commit()
+        db.refresh(obj)
+    else:
+        # Flush so defaults like the id are set
+        db.flush()
+    return obj
 
 # User functions
 def get_user_by_email(email: str, db: Session) -> Optional[User]:
@@ -196,12 +495,8 @@ def get_all_users(db: Session, tenant_id: str = None, skip: int = 0, limit: int
         query = query.filter(User.tenant_id == tenant_id)
     return query.filter(User.isActive == True).offset(skip).limit(limit).all()
 
-def create_user(user_data: dict, db: Session) -> User:
-    db_user = User(**user_data)
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    return db_user
+def create_user(user_data: dict, db: Session, commit: bool = True) -> User:
+    return _save(db, User(**user_data), commit)
 
 # Tenant functions
 def get_tenant_by_id(tenant_id: str, db: Session) -> Optional[Tenant]:
@@ -210,12 +505,8 @@ def get_tenant_by_id(tenant_id: str, db: Session) -> Optional[Tenant]:
 def get_tenant_by_domain(domain: str, db: Session) -> Optional[Tenant]:
     return db.query(Tenant).filter(Tenant.domain == domain).first()
 
-def create_tenant(tenant_data: dict, db: Session) -> Tenant:
-    db_tenant = Tenant(**tenant_data)
-    db.add(db_tenant)
-    db.commit()
-    db.refresh(db_tenant)
-    return db_tenant
+def create_tenant(tenant_data: dict, db: Session, commit: bool = True) -> Tenant:
+    return _save(db, Tenant(**tenant_data), commit)
 
 # Plan functions
 def get_plan_by_id(plan_id: str, db: Session) -> Optional[Plan]:
@@ -231,15 +522,55 @@ def create_plan(plan_data: dict, db: Session) -> Plan:
     db.refresh(db_plan)
     return db_plan
 
+# Versioned update helper (shared by projects and tasks)
+def _compare_and_swap(model, row_id: str, update_data: dict, db: Session, tenant_id: str = None,
+                      expected_version: int = None):
+    """Apply update_data and bump the version in a single UPDATE statement.
+
+    When expected_version is given the row is only written if its version still
+    matches; otherwise VersionConflictError is raised. No row locks are taken.
+    """
+    values = {key: value for key, value in update_data.items()
+              if key != "version" and hasattr(model, key) and value is not None}
+    values["version"] = model.version + 1
+
+    query = db.query(model).filter(model.id == row_id)
+    if tenant_id:
+        query = query.filter(model.tenant_id == tenant_id)
+    if expected_version is not None:
+        query = query.filter(model.version == expected_version)
+
+    updated = query.update(values, synchronize_session=False)
+    if not updated:
+        db.rollback()
+        current = db.query(model.version).filter(model.id == row_id)
+        if tenant_id:
+            current = current.filter(model.tenant_id == tenant_id)
+        current = current.first()
+        if current is not None and expected_version is not None:
+            raise VersionConflictError(current.version)
+        return None
+
+    db.commit()
+    return db.query(model).filter(model.id == row_id).first()
+
 # Project functions
+def _project_response_options():
+    # Everything transform_project_to_response touches, loaded in a constant number of queries
+    return (joinedload(Project.projectManager), selectinload(Project.teamMembers))
+
+def _task_response_options():
+    # Everything transform_task_to_response touches, loaded with the task row itself
+    return (joinedload(Task.assignedTo), joinedload(Task.createdBy))
+
 def get_project_by_id(project_id: str, db: Session, tenant_id: str = None) -> Optional[Project]:
-    query = db.query(Project).filter(Project.id == project_id)
+    query = db.query(Project).options(*_project_response_options()).filter(Project.id == project_id)
     if tenant_id:
         query = query.filter(Project.tenant_id == tenant_id)
     return query.first()
 
 def get_all_projects(db: Session, tenant_id: str = None, skip: int = 0, limit: int = 100) -> List[Project]:
-    query = db.query(Project)
+    query = db.query(Project).options(*_project_response_options())
     if tenant_id:
         query = query.filter(Project.tenant_id == tenant_id)
     return query.offset(skip).limit(limit).all()
@@ -251,19 +582,9 @@ def create_project(project_data: dict, db: Session) -> Project:
     db.refresh(db_project)
     return db_project
 
-def update_project(project_id: str, update_data: dict, db: Session, tenant_id: str = None) -> Optional[Project]:
-    query = db.query(Project).filter(Project.id == project_id)
-    if tenant_id:
-        query = query.filter(Project.tenant_id == tenant_id)
-    
-    project = query.first()
-    if project:
-        for key, value in update_data.items():
-            if hasattr(project, key) and value is not None:
-                setattr(project, key, value)
-        db.commit()
-        db.refresh(project)
-    return project
+def update_project(project_id: str, update_data: dict, db: Session, tenant_id: str = None,
+                   expected_version: int = None) -> Optional[Project]:
+    return _compare_and_swap(Project, project_id, update_data, db, tenant_id, expected_version)
 
 def delete_project(project_id: str, db: Session, tenant_id: str = None) -> bool:
     query = db.query(Project).filter(Project.id == project_id)
@@ -279,19 +600,19 @@ def delete_project(project_id: str, db: Session, tenant_id: str = None) -> bool:
 
 # Task functions
 def get_task_by_id(task_id: str, db: Session, tenant_id: str = None) -> Optional[Task]:
-    query = db.query(Task).filter(Task.id == task_id)
+    query = db.query(Task).options(*_task_response_options()).filter(Task.id == task_id)
     if tenant_id:
         query = query.filter(Task.tenant_id == tenant_id)
     return query.first()
 
 def get_all_tasks(db: Session, tenant_id: str = None, skip: int = 0, limit: int = 100) -> List[Task]:
-    query = db.query(Task)
+    query = db.query(Task).options(*_task_response_options())
     if tenant_id:
         query = query.filter(Task.tenant_id == tenant_id)
     return query.offset(skip).limit(limit).all()
 
 def get_tasks_by_project(project_id: str, db: Session, tenant_id: str = None) -> List[Task]:
-    query = db.query(Task).filter(Task.projectId == project_id)
+    query = db.query(Task).options(*_task_response_options()).filter(Task.projectId == project_id)
     if tenant_id:
         query = query.filter(Task.tenant_id == tenant_id)
     return query.all()
@@ -303,19 +624,9 @@ def create_task(task_data: dict, db: Session) -> Task:
     db.refresh(db_task)
     return db_task
 
-def update_task(task_id: str, update_data: dict, db: Session, tenant_id: str = None) -> Optional[Task]:
-    query = db.query(Task).filter(Task.id == task_id)
-    if tenant_id:
-        query = query.filter(Task.tenant_id == tenant_id)
-    
-    task = query.first()
-    if task:
-        for key, value in update_data.items():
-            if hasattr(task, key) and value is not None:
-                setattr(task, key, value)
-        db.commit()
-        db.refresh(task)
-    return task
+def update_task(task_id: str, update_data: dict, db: Session, tenant_id: str = None,
+                expected_version: int = None) -> Optional[Task]:
+    return _compare_and_swap(Task, task_id, update_data, db, tenant_id, expected_version)
 
 def delete_task(task_id: str, db: Session, tenant_id: str = None) -> bool:
     query = db.query(Task).filter(Task.id == task_id)
@@ -329,24 +640,54 @@ def delete_task(task_id: str, db: Session, tenant_id: str = None) -> bool:
         return True
     return False
 
+# Export functions (server-side cursor, flat rows, no relationship loading)
+def iter_task_export_rows(db: Session, tenant_id: str, batch_size: int = 1000):
+    assignee = aliased(User)
+    creator = aliased(User)
+    query = (
+        db.query(
+            Task.id, Task.title, Task.description, Task.status, Task.priority,
+            Task.projectId, Project.name.label("projectName"),
+            assignee.email.label("assignedToEmail"), creator.email.label("createdByEmail"),
+            Task.dueDate, Task.estimatedHours, Task.actualHours, Task.tags,
+            Task.completedAt, Task.version, Task.createdAt, Task.updatedAt
+        )
+        .join(Project, Task.projectId == Project.id)
+        .outerjoin(assignee, Task.assignedToId == assignee.id)
+        .outerjoin(creator, Task.createdById == creator.id)
+        .filter(Task.tenant_id == tenant_id)
+        .yield_per(batch_size)
+    )
+    for row in query:
+        yield row._asdict()
+
+def iter_project_export_rows(db: Session, tenant_id: str, batch_size: int = 1000):
+    manager = aliased(User)
+    query = (
+        db.query(
+            Project.id, Project.name, Project.description, Project.status, Project.priority,
+            Project.startDate, Project.endDate, Project.completionPercent,
+            Project.budget, Project.actualCost,
+            manager.email.label("projectManagerEmail"),
+            Project.notes, Project.version, Project.createdAt, Project.updatedAt
+        )
+        .outerjoin(manager, Project.projectManagerId == manager.id)
+        .filter(Project.tenant_id == tenant_id)
+        .yield_per(batch_size)
+    )
+    for row in query:
+        yield row._asdict()
+
 # Subscription functions
-def create_subscription(subscription_data: dict, db: Session) -> Subscription:
-    db_subscription = Subscription(**subscription_data)
-    db.add(db_subscription)
-    db.commit()
-    db.refresh(db_subscription)
-    return db_subscription
+def create_subscription(subscription_data: dict, db: Session, commit: bool = True) -> Subscription:
+    return _save(db, Subscription(**subscription_data), commit)
 
 def get_subscription_by_tenant(tenant_id: str, db: Session) -> Subscription:
     return db.query(Subscription).filter(Subscription.tenantId == tenant_id).first()
 
 # Tenant User functions
-def create_tenant_user(tenant_user_data: dict, db: Session) -> TenantUser:
-    db_tenant_user = TenantUser(**tenant_user_data)
-    db.add(db_tenant_user)
-    db.commit()
-    db.refresh(db_tenant_user)
-    return db_tenant_user
+def create_tenant_user(tenant_user_data: dict, db: Session, commit: bool = True) -> TenantUser:
+    return _save(db, TenantUser(**tenant_user_data), commit)
 
 def get_user_tenants(user_id: str, db: Session) -> List[TenantUser]:
     return db.query(TenantUser).filter(
@@ -354,8 +695,120 @@ def get_user_tenants(user_id: str, db: Session) -> List[TenantUser]:
         TenantUser.isActive == True
     ).all()
 
+def get_user_tenant_overview(user_id: str, db: Session) -> List[tuple]:
+    """Active memberships of a user with tenant, latest subscription, plan and usage counters in one query.
+
+    Rows are (membership, tenant, subscription, plan, usage); subscription, plan and usage are None
+    when the tenant has none.
+    """
+    latest_subscription = select(Subscription.id).where(
+        Subscription.tenantId == Tenant.id
+    ).order_by(Subscription.createdAt.desc()).limit(1).correlate(Tenant).scalar_subquery()
+    return db.query(TenantUser, Tenant, Subscription, Plan, TenantUsage).join(
+        Tenant, Tenant.id == TenantUser.tenantId
+    ).outerjoin(
+        Subscription, Subscription.id == latest_subscription
+    ).outerjoin(
+        Plan, Plan.id == Subscription.planId
+    ).outerjoin(
+        TenantUsage, TenantUsage.tenantId == Tenant.id
+    ).filter(
+        TenantUser.userId == user_id,
+        TenantUser.isActive == True
+    ).order_by(Tenant.name).all()
+
+def get_tenant_membership(tenant_id: str, user_id: str, db: Session):
+    """Return (tenant, membership, plan_type) in one query; membership is None if the user has no
+    access and plan_type is that of the tenant's latest subscription. Returns None when the tenant
+    does not exist."""
+    plan_type = select(Plan.planType).join(Subscription, Subscription.planId == Plan.id).where(
+        Subscription.tenantId == Tenant.id
+    ).order_by(Subscription.createdAt.desc()).limit(1).correlate(Tenant).scalar_subquery()
+    row = db.query(Tenant, TenantUser, plan_type).outerjoin(TenantUser, and_(
+        TenantUser.tenantId == Tenant.id,
+        TenantUser.userId == user_id,
+        TenantUser.isActive == True
+    )).filter(Tenant.id == tenant_id).first()
+    if row is None:
+        return None
+    return row[0], row[1], row[2]
+
 def get_tenant_users(tenant_id: str, db: Session) -> List[TenantUser]:
     return db.query(TenantUser).filter(
         TenantUser.tenantId == tenant_id,
         TenantUser.isActive == True
-    ).all()
\ No newline at end of file
+    ).all()
+
+# Idempotency key functions
+def claim_idempotency_key(scope: str, key: str, request_hash: str, ttl_seconds: int, db: Session,
+                          lock_timeout_seconds: int = 60):
+    """Atomically claim an idempotency key.
+
+    Returns (record, claimed). claimed is False when another request already
+    owns the key; the existing record is returned so the caller can replay it.
+    Expired keys and in-progress claims not refreshed for lock_timeout_seconds
+    (the worker died mid-request) are taken over.
+    """
+    existing = None
+    for _ in range(2):
+        now = datetime.utcnow()
+        inserted = db.execute(
+            pg_insert(IdempotencyKey.__table__)
+            .values(id=uuid.uuid4(), scope=scope, key=key, requestHash=request_hash,
+                    status="in_progress", createdAt=now, lockedAt=now,
+                    expiresAt=now + timedelta(seconds=ttl_seconds))
+            .on_conflict_do_nothing(constraint="uq_idempotency_keys_scope_key")
+            .returning(IdempotencyKey.__table__.c.id)
+        ).first()
+        db.commit()
+        if inserted:
+            return db.query(IdempotencyKey).filter(IdempotencyKey.id == inserted.id).first(), True
+        
+        existing = db.query(IdempotencyKey).filter(
+            IdempotencyKey.scope == scope,
+            IdempotencyKey.key == key
+        ).first()
+        if existing is None:
+            continue
+        locked_at = existing.lockedAt or existing.createdAt
+        abandoned = (existing.status == "in_progress" and
+                     locked_at < now - timedelta(seconds=lock_timeout_seconds))
+        if existing.expiresAt > now and not abandoned:
+            return existing, False
+        # Stale claim: delete it (only if nobody replaced or refreshed it meanwhile) and retry
+        db.query(IdempotencyKey).filter(
+            IdempotencyKey.id == existing.id,
+            IdempotencyKey.status == existing.status,
+            IdempotencyKey.lockedAt.is_(None) if existing.lockedAt is None
+            else IdempotencyKey.lockedAt == existing.lockedAt
+        ).delete(synchronize_session=False)
+        db.commit()
+        existing = None
+    return existing, False
+
+def refresh_idempotency_key(record_id, db: Session):
+    """Keep an in-progress claim from being taken over while its request runs"""
+    db.query(IdempotencyKey).filter(
+        IdempotencyKey.id == record_id, IdempotencyKey.status == "in_progress"
+    ).update({"lockedAt": datetime.utcnow()}, synchronize_session=False)
+    db.commit()
+
+def complete_idempotency_key(record_id, status_code: int, content_type: Optional[str], body: bytes, db: Session):
+    db.query(IdempotencyKey).filter(IdempotencyKey.id == record_id).update({
+        "status": "completed",
+        "responseStatus": status_code,
+        "responseContentType": content_type,
+        "responseBody": body
+    }, synchronize_session=False)
+    db.commit()
+
+def release_idempotency_key(record_id, db: Session):
+    db.query(IdempotencyKey).filter(IdempotencyKey.id == record_id).delete(synchronize_session=False)
+    db.commit()
+
+def purge_expired_idempotency_keys(db: Session) -> int:
+    deleted = db.query(IdempotencyKey).filter(
+        IdempotencyKey.expiresAt <= datetime.utcnow()
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
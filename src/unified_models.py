@@ -139,11 +139,13 @@ class ProjectUpdate(BaseModel):
     notes: Optional[str] = None
     projectManagerId: Optional[str] = None
     teamMemberIds: Optional[List[str]] = None
+    version: Optional[int] = None  # expected version for optimistic concurrency
 
 class Project(ProjectBase):
     id: str
     projectManager: TeamMember
     teamMembers: List[TeamMember] = []
+    version: int = 1
     createdAt: datetime
     updatedAt: datetime
     activities: List[Dict[str, Any]] = []
@@ -176,12 +178,14 @@ class TaskUpdate(BaseModel):
     estimatedHours: Optional[float] = None
     actualHours: Optional[float] = None
     tags: Optional[List[str]] = None
+    version: Optional[int] = None  # expected version for optimistic concurrency
 
 class Task(TaskBase):
     id: str
     project: str
     assignedTo: Optional[Dict[str, str]] = None
     createdBy: Dict[str, str]
+    version: int = 1
     completedAt: Optional[datetime] = None
     createdAt: datetime
     updatedAt: datetime
@@ -294,6 +298,18 @@ class TenantUsersResponse(BaseModel):
     users: List[TenantUser]
     pagination: dict
 
+class ImportRowError(BaseModel):
+    line: int
+    error: str
+
+class ImportReport(BaseModel):
+    rowsRead: int = 0
+    rowsImported: int = 0
+    rowsFailed: int = 0
+    errors: List[ImportRowError] = []
+    elapsedSeconds: float = 0.0
+    rowsPerSecond: float = 0.0
+
 class SubscribeRequest(BaseModel):
     planId: str
     tenantName: str
@@ -20,7 +20,7 @@ from .unified_database import (
     User, Tenant, Plan, Project, Task, TenantUser
 )
 from .unified_models import UserRole, ProjectStatus, ProjectPriority, TaskStatus, TaskPriority, PlanType, PlanFeature, SubscriptionStatus, TenantRole
-from .auth import get_password_hash
+from .auth import get_password_hashes
 
 def seed_database():
     """Seed the database with initial data"""
@@ -191,7 +191,7 @@ def seed_database():
                     "firstName": "System",
                     "lastName": "Administrator",
                     "userRole": UserRole.SUPER_ADMIN.value,
-                    "hashedPassword": get_password_hash("admin123"),
+                    "password": "admin123",
                     "isActive": True
                 },
                 {
@@ -201,7 +201,7 @@ def seed_database():
                     "firstName": "John",
                     "lastName": "Smith",
                     "userRole": UserRole.PROJECT_MANAGER.value,
-                    "hashedPassword": get_password_hash("password123"),
+                    "password": "password123",
                     "isActive": True
                 },
                 {
@@ -211,7 +211,7 @@ def seed_database():
                     "firstName": "Sarah",
                     "lastName": "Johnson",
                     "userRole": UserRole.TEAM_MEMBER.value,
-                    "hashedPassword": get_password_hash("password123"),
+                    "password": "password123",
                     "isActive": True
                 },
                 {
@@ -221,7 +221,7 @@ def seed_database():
                     "firstName": "Mike",
                     "lastName": "Wilson",
                     "userRole": UserRole.TEAM_MEMBER.value,
-                    "hashedPassword": get_password_hash("password123"),
+                    "password": "password123",
                     "isActive": True
                 },
                 {
@@ -231,7 +231,7 @@ def seed_database():
                     "firstName": "Lisa",
                     "lastName": "Brown",
                     "userRole": UserRole.TEAM_MEMBER.value,
-                    "hashedPassword": get_password_hash("password123"),
+                    "password": "password123",
                     "isActive": True
                 },
                 {
@@ -241,11 +241,16 @@ def seed_database():
                     "firstName": "Client",
                     "lastName": "User",
                     "userRole": UserRole.CLIENT.value,
-                    "hashedPassword": get_password_hash("client123"),
+                    "password": "client123",
                     "isActive": True
                 }
             ]
             
+            # Hash all passwords in one parallel batch instead of one bcrypt call at a time
+            hashes = get_password_hashes([user_data.pop("password") for user_data in users_data])
+            for user_data, hashed_password in zip(users_data, hashes):
+                user_data["hashedPassword"] = hashed_password
+            
             for user_data in users_data:
                 user = create_user(user_data, db)
                 created_users.append(user)
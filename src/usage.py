@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Per-tenant usage counters (projects, active members, tasks).
+
+A row in tenant_usage holds the counts for one tenant. An after_flush hook
+updates projects and users whenever the ORM inserts or deletes a project or
+tenant membership, or changes a membership's isActive. users counts active
+tenant_users rows, the same memberships the tenant switcher lists; deleting
+a user ends their memberships. The update is in the same transaction as the
+change. Bulk imports add their row counts explicitly. Plan quotas on
+POST /projects and POST /users reserve the new row with one conditional
+UPDATE, so concurrent creates cannot overshoot the limit; the hook then
+skips the rows that were reserved.
+
+Task inserts and deletes are summed per transaction instead and applied in
+one UPDATE just before the commit, so the counter row is locked only for the
+commit itself rather than for the whole request; many task writes of one
+tenant don't queue behind each other.
+
+reconcile_usage() recomputes all counts from the real tables in one
+statement and corrects drift from writes that bypass the hook (raw SQL,
+scripts run without this module imported). Job workers run it daily; by hand:
+
+Usage:
+    python -m src.usage reconcile                 # all tenants
+    python -m src.usage reconcile --tenant <id>   # one tenant
+"""
+import argparse
+import sys
+from collections import defaultdict
+
+from fastapi import HTTPException, status
+from sqlalchemy import event, inspect, select, text
+from sqlalchemy.orm import Session
+
+from .unified_database import (
+    SessionLocal, Plan, Project, Subscription, Task, TenantUsage, TenantUser
+)
+
+# Plan column limiting each counted resource
+QUOTA_LIMITS = {"projects": Plan.maxProjects, "users": Plan.maxUsers}
+
+ADD_USAGE_SQL = text("""
+    INSERT INTO tenant_usage ("tenantId", projects, users, tasks, "updatedAt")
+    VALUES (:tenant_id, GREATEST(:projects, 0), GREATEST(:users, 0), GREATEST(:tasks, 0), now())
+    ON CONFLICT ("tenantId") DO UPDATE SET
+        projects = GREATEST(tenant_usage.projects + :projects, 0),
+        users = GREATEST(tenant_usage.users + :users, 0),
+        tasks = GREATEST(tenant_usage.tasks + :tasks, 0),
+        "updatedAt" = now()
+""")
+
+ENSURE_USAGE_SQL = text("""
+    INSERT INTO tenant_usage ("tenantId", projects, users, tasks, "updatedAt")
+    VALUES (:tenant_id, 0, 0, 0, now())
+    ON CONFLICT ("tenantId") DO NOTHING
+""")
+
+# Check and increment in one statement; no row means the limit would be exceeded
+RESERVE_SQL = """
+    UPDATE tenant_usage SET {resource} = {resource} + :adding, "updatedAt" = now()
+    WHERE "tenantId" = :tenant_id AND {resource} + :adding <= :limit
+    RETURNING {resource}
+"""
+
+# Session.info key: {(tenant_id, resource): count} reserved by check_quota, not yet flushed
+RESERVED = "usage_reserved"
+
+# Session.info key: {tenant_id: count} of flushed task inserts minus deletes, applied at commit
+PENDING_TASKS = "usage_pending_tasks"
+
+RECONCILE_SQL = """
+    INSERT INTO tenant_usage ("tenantId", projects, users, tasks, "reconciledAt", "updatedAt")
+    SELECT t.id,
+           (SELECT count(*) FROM projects p WHERE p.tenant_id = t.id),
+           (SELECT count(*) FROM tenant_users m JOIN users u ON u.id = m."userId"
+             WHERE m."tenantId" = t.id AND m."isActive" AND u."isActive"),
+           (SELECT count(*) FROM tasks k WHERE k.tenant_id = t.id),
+           now(), now()
+    FROM tenants t
+    {where}
+    ON CONFLICT ("tenantId") DO UPDATE SET
+        projects = EXCLUDED.projects,
+        users = EXCLUDED.users,
+        tasks = EXCLUDED.tasks,
+        "reconciledAt" = EXCLUDED."reconciledAt",
+        "updatedAt" = EXCLUDED."updatedAt"
+"""
+
+def add_usage(db: Session, tenant_id, projects: int = 0, users: int = 0, tasks: int = 0):
+    """Adjust a tenant's counters inside the caller's transaction"""
+    if tenant_id and (projects or users or tasks):
+        db.execute(ADD_USAGE_SQL, {
+            "tenant_id": str(tenant_id), "projects": projects, "users": users, "tasks": tasks
+        })
+
+def _active_member_delta(member: TenantUser, is_new: bool, is_deleted: bool) -> int:
+    if is_new:
+        return 0 if member.isActive is False else 1
+    if is_deleted:
+        history = inspect(member).attrs.isActive.history
+        was_active = history.deleted[0] if history.deleted else member.isActive
+        return 0 if was_active is False else -1
+    history = inspect(member).attrs.isActive.history
+    if not history.has_changes():
+        return 0
+    was_active = history.deleted[0] if history.deleted else None
+    now_active = history.added[0] if history.added else None
+    return int(now_active is not False) - int(was_active is not False)
+
+def _count_flushed_changes(session, flush_context):
+    deltas = defaultdict(lambda: {"projects": 0, "users": 0})
+    pending_tasks = session.info.setdefault(PENDING_TASKS, defaultdict(int))
+    for objects, sign in ((session.new, 1), (session.deleted, -1)):
+        for obj in objects:
+            if isinstance(obj, Project) and obj.tenant_id:
+                deltas[str(obj.tenant_id)]["projects"] += sign
+            elif isinstance(obj, Task) and obj.tenant_id:
+                pending_tasks[str(obj.tenant_id)] += sign
+            elif isinstance(obj, TenantUser) and obj.tenantId:
+                deltas[str(obj.tenantId)]["users"] += _active_member_delta(obj, sign > 0, sign < 0)
+    for obj in session.dirty:
+        if isinstance(obj, TenantUser) and obj.tenantId:
+            deltas[str(obj.tenantId)]["users"] += _active_member_delta(obj, False, False)
+
+    reserved = session.info.get(RESERVED, {})
+    connection = session.connection()
+    for tenant_id, delta in deltas.items():
+        for resource, change in delta.items():
+            # Rows check_quota already counted
+            held = min(reserved.get((tenant_id, resource), 0), max(change, 0))
+            if held:
+                delta[resource] -= held
+                reserved[(tenant_id, resource)] -= held
+        if any(delta.values()):
+            connection.execute(ADD_USAGE_SQL, {"tenant_id": tenant_id, "tasks": 0, **delta})
+
+def _apply_pending_tasks(session):
+    # Flush first: commit flushes only after before_commit, and those tasks must be counted too
+    session.flush()
+    pending_tasks = session.info.pop(PENDING_TASKS, None)
+    if not pending_tasks:
+        return
+    connection = session.connection()
+    for tenant_id, tasks in pending_tasks.items():
+        if tasks:
+            connection.execute(ADD_USAGE_SQL, {"tenant_id": tenant_id, "projects": 0, "users": 0, "tasks": tasks})
+
+def _forget_reservations(session, *args):
+    # Committed reservations are in the counters; rolled back ones are gone with the transaction
+    session.info.pop(RESERVED, None)
+    session.info.pop(PENDING_TASKS, None)
+
+for _name, _listener in (("after_flush", _count_flushed_changes),
+                         ("before_commit", _apply_pending_tasks),
+                         ("after_commit", _forget_reservations),
+                         ("after_soft_rollback", _forget_reservations)):
+    if not event.contains(Session, _name, _listener):
+        event.listen(Session, _name, _listener)
+
+def _latest_plan_id(tenant_id: str):
+    return select(Subscription.planId).where(
+        Subscription.tenantId == tenant_id
+    ).order_by(Subscription.createdAt.desc()).limit(1).scalar_subquery()
+
+def get_usage_and_limits(tenant_id: str, db: Session) -> dict:
+    """Counters and the latest subscription's plan limits for a tenant"""
+    usage = db.query(TenantUsage).filter(TenantUsage.tenantId == tenant_id).first()
+    plan = db.query(Plan).filter(Plan.id == _latest_plan_id(tenant_id)).first()
+    return {
+        "usage": {
+            "projects": usage.projects if usage else 0,
+            "users": usage.users if usage else 0,
+            "tasks": usage.tasks if usage else 0,
+        },
+        "limits": {
+            "projects": plan.maxProjects if plan else None,
+            "users": plan.maxUsers if plan else None,
+        },
+        "plan_type": plan.planType if plan else None,
+        "reconciled_at": usage.reconciledAt if usage else None,
+    }
+
+def check_quota(db: Session, tenant_id: str, resource: str, adding: int = 1):
+    """Reserve `adding` more of `resource` in the caller's transaction, or raise 403 at the plan limit.
+
+    The counter row stays locked until the transaction ends, so concurrent creates
+    of the same tenant queue here instead of all passing the check.
+    """
+    limit = db.query(QUOTA_LIMITS[resource]).filter(Plan.id == _latest_plan_id(tenant_id)).scalar()
+    if limit is None:
+        return
+    db.execute(ENSURE_USAGE_SQL, {"tenant_id": str(tenant_id)})
+    reserved = db.execute(text(RESERVE_SQL.format(resource=resource)), {
+        "tenant_id": str(tenant_id), "adding": adding, "limit": limit
+    }).first()
+    if reserved is None:
+        used = db.query(getattr(TenantUsage, resource)).filter(TenantUsage.tenantId == tenant_id).scalar()
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"Plan limit reached: {used} of {limit} {resource} in use. Upgrade your plan to add more."
+        )
+    key = (str(tenant_id), resource)
+    pending = db.info.setdefault(RESERVED, {})
+    pending[key] = pending.get(key, 0) + adding
+
+def reconcile_usage(db: Session, tenant_id: str = None) -> int:
+    """Recompute counters from the real tables; returns the number of tenants reconciled"""
+    where = "WHERE t.id = :tenant_id" if tenant_id else ""
+    result = db.execute(text(RECONCILE_SQL.format(where=where)), {"tenant_id": tenant_id} if tenant_id else {})
+    db.commit()
+    return result.rowcount
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain per-tenant usage counters")
+    parser.add_argument("command", choices=["reconcile"])
+    parser.add_argument("--tenant", help="Only this tenant id")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        reconciled = reconcile_usage(db, args.tenant)
+        print(f"✅ Reconciled usage for {reconciled} tenant(s)")
+    except Exception as e:
+        print(f"❌ Reconcile failed: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Startup warmup run before a worker reports ready.
+
+Pre-opens pool connections so the first requests don't pay connection setup,
+primes the plans and tenant caches, and runs the response serializers once on
+real rows so pydantic's validators are built before traffic arrives.
+"""
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import text
+
+from .unified_database import SessionLocal, Tenant, get_all_projects, get_all_tasks, get_database
+
+logger = logging.getLogger("sparkco.warmup")
+
+WARMUP_CONNECTIONS = int(os.getenv("WARMUP_CONNECTIONS", 5))
+WARMUP_TENANTS = int(os.getenv("WARMUP_TENANTS", 1000))
+
+_warm_lock = threading.Lock()
+
+def is_warm() -> bool:
+    """Whether the current app has warmed up (the flag lives on its Database)"""
+    return get_database().locals.get("warm", False)
+
+def _open_connections(engine, count: int):
+    """Check out `count` connections at once so the pool holds that many open ones"""
+    connections = []
+    try:
+        for _ in range(min(count, engine.pool.size())):
+            connection = engine.connect()
+            connections.append(connection)
+            connection.execute(text("SELECT 1"))
+    finally:
+        for connection in connections:
+            connection.close()
+    return len(connections)
+
+def _prime_caches(db):
+    from .routes.plans import get_plans_response
+    from .routes.tenants import tenant_summary
+    from .cache import tenant_cache
+
+    get_plans_response(db)
+    tenants = db.query(Tenant).filter(Tenant.isActive == True).order_by(
+        Tenant.createdAt.desc()
+    ).limit(WARMUP_TENANTS).all()
+    for tenant in tenants:
+        tenant_cache.set(str(tenant.id), tenant_summary(tenant))
+    return len(tenants)
+
+def _exercise_serializers(db):
+    from .routes.projects import transform_project_to_response
+    from .routes.tasks import transform_task_to_response
+
+    for project in get_all_projects(db, limit=1):
+        transform_project_to_response(project).model_dump_json()
+    for task in get_all_tasks(db, limit=1):
+        transform_task_to_response(task).model_dump_json()
+
+def warm_up(engine) -> bool:
+    """Run all warmup steps once; returns True when the worker is warm"""
+    database = get_database()
+    with _warm_lock:
+        if database.locals.get("warm"):
+            return True
+        started = time.perf_counter()
+        opened = _open_connections(engine, WARMUP_CONNECTIONS)
+        db = SessionLocal()
+        try:
+            tenants = _prime_caches(db)
+            _exercise_serializers(db)
+        finally:
+            db.close()
+        database.locals["warm"] = True
+        logger.info(
+            "warmup done in %.0fms: %d connections, %d tenants cached",
+            (time.perf_counter() - started) * 1000, opened, tenants
+        )
+        return True
@@ -1,5 +1,17 @@
 #!/bin/bash
+# Usage: ./start.sh              development server (single process)
+#        ./start.sh production   gunicorn with one Uvicorn worker per CPU (see gunicorn.conf.py)
+#        ./start.sh worker       background job worker (run the API with JOB_WORKERS=0)
+# All apply pending schema migrations first.
 
 cd "$(dirname "$0")"
 source env/bin/activate
-uvicorn src.main:app --host=0.0.0.0
\ No newline at end of file
+python -m src.migrate || exit 1
+
+if [ "$1" = "worker" ]; then
+    exec python -m src.jobs worker
+fi
+if [ "$1" = "production" ]; then
+    exec gunicorn -c gunicorn.conf.py src.main:app
+fi
+uvicorn src.main:app --host=0.0.0.0